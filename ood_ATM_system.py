@@ -16,29 +16,184 @@ workflow
 - ATM displays transaction details
 
 """ 
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
 from enum import Enum
 
+try:
+    import numpy as np
+except ImportError:  # only needed for AccountStore
+    np = None
+
 
 class AccountState(Enum):
     ACTIVE = "active"
     INACTIVE = "inactive"
     CLOSED = "closed"  
 
+class TransactionType(Enum):
+    OPEN = 1
+    DEPOSIT = 2
+    WITHDRAW = 3
+    TRANSFER = 4
+
+
+class Transaction:
+    def __init__(self, tx_type, account_id, amount, counterparty_id=None, timestamp=None, tx_id=None):
+        self.tx_id = tx_id  # assigned by the Ledger
+        self.tx_type = tx_type
+        self.account_id = account_id
+        self.amount = amount
+        self.counterparty_id = counterparty_id
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return (f"Transaction({self.tx_id}, {self.tx_type.name}, account={self.account_id}, "
+                f"amount={self.amount}, counterparty={self.counterparty_id})")
+
+
+class Ledger:
+    """
+    Append-only transaction log of fixed-width records.
+
+    Writers block until their record is fsynced, but one fsync covers every
+    record written before it (group commit): a batch is flushed as soon as
+    `batch_size` records are pending, or after `max_delay` seconds.
+    """
+    # tx_id, type, account_id, counterparty_id (-1 if none), amount, timestamp
+    _RECORD = struct.Struct("<QBqqdd")
+
+    def __init__(self, path, batch_size=64, max_delay=0.002):
+        self._path = path
+        self._batch_size = batch_size
+        self._max_delay = max_delay
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size % self._RECORD.size:
+            # drop a torn final record so new appends start on a record boundary
+            size -= size % self._RECORD.size
+            os.truncate(path, size)
+        self._file = open(path, "ab")
+        self._cond = threading.Condition()
+        self._next_tx_id = size // self._RECORD.size + 1
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+
+    def append(self, transaction):
+        """Write a transaction and return once it is durable."""
+        with self._cond:
+            counterparty = -1 if transaction.counterparty_id is None else transaction.counterparty_id
+            # pack before taking the id, so a bad record leaves no gap in tx_ids
+            record = self._RECORD.pack(self._next_tx_id, transaction.tx_type.value,
+                                       transaction.account_id, counterparty,
+                                       transaction.amount, transaction.timestamp)
+            self._file.write(record)
+            transaction.tx_id = self._next_tx_id
+            self._next_tx_id += 1
+            self._written += 1
+            seq = self._written
+            if self._written - self._synced < self._batch_size:
+                # give other writers a chance to join this batch
+                self._cond.wait_for(lambda: self._synced >= seq, timeout=self._max_delay)
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._sync_locked()
+        return transaction
+
+    def _sync_locked(self):
+        """Flush everything written so far; fsync runs without holding the lock."""
+        self._syncing = True
+        target = self._written
+        self._file.flush()
+        self._cond.release()
+        try:
+            os.fsync(self._file.fileno())
+        finally:
+            self._cond.acquire()
+            self._syncing = False
+            self._synced = max(self._synced, target)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if self._synced < self._written:
+                self._sync_locked()
+            self._file.close()
+
+    @classmethod
+    def replay(cls, path):
+        """Yield every complete transaction in the ledger file."""
+        with open(path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % cls._RECORD.size  # ignore a torn final record
+        for tx_id, tx_type, account_id, counterparty, amount, timestamp in cls._RECORD.iter_unpack(data[:usable]):
+            yield Transaction(TransactionType(tx_type), account_id, amount,
+                              None if counterparty == -1 else counterparty, timestamp, tx_id)
+
+    @classmethod
+    def rebuild_balances(cls, path):
+        """Recompute account_id -> balance from the ledger alone."""
+        balances = {}
+        for tx in cls.replay(path):
+            if tx.tx_type in (TransactionType.OPEN, TransactionType.DEPOSIT):
+                balances[tx.account_id] = balances.get(tx.account_id, 0) + tx.amount
+            elif tx.tx_type == TransactionType.WITHDRAW:
+                balances[tx.account_id] = balances.get(tx.account_id, 0) - tx.amount
+            elif tx.tx_type == TransactionType.TRANSFER:
+                balances[tx.account_id] = balances.get(tx.account_id, 0) - tx.amount
+                balances[tx.counterparty_id] = balances.get(tx.counterparty_id, 0) + tx.amount
+        return balances
+
+
 class Card:
+    PIN_HASH_ITERATIONS = 100_000
+
     def __init__(self, card_number, pin, account):
         self._card_number = card_number
-        self._pin = pin
+        # only a salted hash of the PIN is kept
+        self._pin_salt = os.urandom(16)
+        self._pin_hash = self._hash_pin(pin)
         self._account = account 
 
+    def _hash_pin(self, pin):
+        return hashlib.pbkdf2_hmac("sha256", str(pin).encode(), self._pin_salt, self.PIN_HASH_ITERATIONS)
+
+    def verify_pin(self, entered_pin):
+        """Compare in constant time so timing does not leak how much of the PIN matched."""
+        return hmac.compare_digest(self._hash_pin(entered_pin), self._pin_hash)
+
+    @property
+    def card_number(self):
+        return self._card_number
+
     @property
     def account(self):
         return self._account          
 
 class Account:
-    def __init__(self, account_id, amount):
+    def __init__(self, account_id, amount, store=None):
         self._account_id = account_id
-        self._balance = amount
-        self._cards = []
+        self._store = store  # AccountStore holding the balance, if any
+        self._lock = threading.Lock()
+        if store is None:
+            self._balance = amount
+        else:
+            self._index = store.register(account_id, amount, self._lock)
+        self._cards = set()
         self._state = AccountState.INACTIVE
     
     @property
@@ -47,6 +202,8 @@ class Account:
     
     @property
     def balance(self):
+        if self._store is not None:
+            return self._store.balance_at(self._index)
         return self._balance
     
     @property
@@ -56,9 +213,17 @@ class Account:
     @property
     def state(self):
         return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+
+    @property
+    def lock(self):
+        return self._lock
     
     def add_card(self, card):
-        self._cards.append(card)
+        self._cards.add(card)
 
     def remove_card(self, card):
         if card in self._cards:
@@ -66,19 +231,216 @@ class Account:
         else:
             raise Exception("Card not found in Account")
    
+    def check_amount(self, amount):
+        """Raise if the balance can't take `amount`, before anything is recorded."""
+        if self._store is not None:
+            AccountStore._cents(amount)
+
     def increase_balance(self, amount):
-        self._balance += amount
+        if self._store is not None:
+            self._store.add_at(self._index, amount)
+        else:
+            self._balance += amount
 
     def decrease_balance(self, amount):
-        self._balance -= amount   
+        if self._store is not None:
+            self._store.add_at(self._index, -amount)
+        else:
+            self._balance -= amount   
+
+
+class AccountStore:
+    """
+    Columnar balance storage: one int64 array of integer cents indexed by
+    account, with Account objects acting as views over it. Bulk settlement
+    runs vectorized over the whole array and gives the same results as the
+    per-account functions `apply_interest` / `apply_fee` / `batch_deposit`.
+
+    Single-account updates run under that account's own lock, as ATM
+    operations already hold it; only growing the array takes every
+    account lock. Bulk operations do not take per-account locks; run them
+    while no ATM sessions are mutating balances.
+    """
+    def __init__(self, capacity=1024):
+        if np is None:
+            raise ImportError("AccountStore requires numpy")
+        self._balances = np.zeros(capacity, dtype=np.int64)
+        self._index = {}  # account_id -> position in _balances
+        self._ids = []  # position -> account_id
+        self._account_locks = []  # position -> lock guarding that balance
+        self._lock = threading.Lock()  # guards registration
+
+    def register(self, account_id, amount, account_lock):
+        amount = self._cents(amount)
+        with self._lock:
+            if account_id in self._index:
+                raise ValueError("Account already in store")
+            index = len(self._ids)
+            if index == len(self._balances):
+                self._grow()
+            self._balances[index] = amount
+            self._index[account_id] = index
+            self._ids.append(account_id)
+            self._account_locks.append(account_lock)
+            return index
+
+    def _grow(self):
+        # no update may land on the old array after it is copied; take the
+        # account locks in account_id order, as lock_accounts() does
+        with ExitStack() as stack:
+            for index in sorted(range(len(self._ids)), key=self._ids.__getitem__):
+                stack.enter_context(self._account_locks[index])
+            self._balances = np.concatenate([self._balances, np.zeros_like(self._balances)])
+
+    @staticmethod
+    def _cents(amount):
+        if amount != int(amount):
+            raise ValueError("AccountStore balances must be integer cents")
+        return int(amount)
+
+    def balance_at(self, index):
+        return int(self._balances[index])
+
+    def add_at(self, index, amount):
+        """Add to one balance; call with the owning account's lock held."""
+        self._balances[index] += self._cents(amount)
+
+    def balances(self):
+        """Live view of all balances, in registration order."""
+        return self._balances[:len(self._ids)]
+
+    def apply_interest(self, rate_bps):
+        """Credit floor(balance * rate_bps / 10000) to every positive balance."""
+        balances = self.balances()
+        interest = balances * rate_bps // 10_000
+        balances += np.where(balances > 0, interest, 0)
+
+    def apply_fee(self, fee):
+        """Charge `fee` to every account that can cover it."""
+        balances = self.balances()
+        balances -= np.where(balances >= fee, fee, 0)
+
+    def batch_deposit(self, account_ids, amounts):
+        """Deposit amounts[i] into account_ids[i]; repeated ids accumulate."""
+        positions = np.fromiter((self._index[account_id] for account_id in account_ids),
+                                dtype=np.int64, count=len(account_ids))
+        requested = np.asarray(amounts)
+        with np.errstate(invalid="ignore"):  # NaN/inf fail the comparison below instead
+            cents = requested.astype(np.int64)
+        if not np.array_equal(cents, requested):
+            raise ValueError("AccountStore balances must be integer cents")
+        np.add.at(self.balances(), positions, cents)
+
+
+def apply_interest(accounts, rate_bps):
+    """Per-account reference path for AccountStore.apply_interest."""
+    for account in accounts:
+        if account.balance > 0:
+            account.increase_balance(account.balance * rate_bps // 10_000)
+
+
+def apply_fee(accounts, fee):
+    """Per-account reference path for AccountStore.apply_fee."""
+    for account in accounts:
+        if account.balance >= fee:
+            account.decrease_balance(fee)
+
+
+def batch_deposit(accounts_by_id, account_ids, amounts):
+    """Per-account reference path for AccountStore.batch_deposit."""
+    for account_id, amount in zip(account_ids, amounts):
+        accounts_by_id[account_id].increase_balance(amount)
+
+
+class Bank:
+    """Owns accounts and the card registry ATMs authenticate against."""
+    def __init__(self, name, store=None, ledger=None):
+        self._name = name
+        self._store = store  # optional AccountStore backing every account's balance
+        self._ledger = ledger  # optional Ledger recording each opening balance
+        self._accounts = {}  # account_id -> Account
+        self._cards = {}  # card_number -> Card
+        # checked in place of a missing card so unknown numbers take as long to reject
+        self._dummy_card = Card(None, os.urandom(16).hex(), None)
+
+    @property
+    def store(self):
+        return self._store
+
+    def open_account(self, account_id, amount=0):
+        if account_id in self._accounts:
+            raise Exception("Account already exists")
+        if self._store is not None:
+            AccountStore._cents(amount)
+        # record first: an account the ledger can't hold must not be registered
+        if self._ledger:
+            self._ledger.append(Transaction(TransactionType.OPEN, account_id, amount))
+        account = Account(account_id, amount, store=self._store)
+        self._accounts[account_id] = account
+        return account
+
+    def get_account(self, account_id):
+        return self._accounts.get(account_id)
+
+    def issue_card(self, card_number, pin, account):
+        if card_number in self._cards:
+            raise Exception("Card number already issued")
+        card = Card(card_number, pin, account)
+        self._cards[card_number] = card
+        account.add_card(card)
+        return card
+
+    def cancel_card(self, card_number):
+        card = self._cards.pop(card_number, None)
+        if card is None:
+            raise Exception("Card not found")
+        card.account.remove_card(card)
+
+    def get_card(self, card_number):
+        return self._cards.get(card_number)
+
+    def authenticate(self, card_number, entered_pin):
+        """Resolve a card number and check its PIN. Returns the Card."""
+        card = self._cards.get(card_number)
+        verified = (card or self._dummy_card).verify_pin(entered_pin)
+        if card is None or not verified:
+            raise Exception("Invalid card or PIN")
+        return card
+
+
+def lock_accounts(*accounts):
+    """
+    Lock accounts in account_id order so that concurrent transfers
+    between the same pair of accounts can never deadlock.
+    """
+    stack = ExitStack()
+    unique = {account.account_id: account for account in accounts}
+    for account_id in sorted(unique):
+        stack.enter_context(unique[account_id].lock)
+    return stack
+
+
+def check_amount(amount):
+    """Reject anything but a positive, finite number of money units."""
+    if (isinstance(amount, bool) or not isinstance(amount, (int, float))
+            or not math.isfinite(amount) or amount <= 0):
+        raise Exception("Amount must be a positive number")
 
 
 class ATM:
-    def __init__(self, atm_id, location):
+    def __init__(self, atm_id, location, ledger=None, bank=None):
         self._atm_id = atm_id
         self._location = location
+        self._bank = bank
         self._current_card = None
         self._current_account = None
+        self._ledger = ledger
+
+    def _record(self, tx_type, account, amount, recipient=None):
+        """Make the transaction durable; call under the account locks, before the balances change."""
+        if self._ledger:
+            self._ledger.append(Transaction(tx_type, account.account_id, amount,
+                                            recipient.account_id if recipient else None))
     
     @property
     def current_card(self):
@@ -89,13 +451,21 @@ class ATM:
         return self._current_account
        
     def login(self, card, entered_pin):
-        if card.pin == entered_pin:
-            self._current_card = card
-            account = card.account
-            self._current_account = account
-            account.state = AccountState.ACTIVE
+        if card.verify_pin(entered_pin):
+            self._start_session(card)
         else:
             raise Exception("Invalid PIN")
+
+    def login_with_card_number(self, card_number, entered_pin):
+        if self._bank is None:
+            raise Exception("ATM is not connected to a bank")
+        self._start_session(self._bank.authenticate(card_number, entered_pin))
+
+    def _start_session(self, card):
+        self._current_card = card
+        account = card.account
+        self._current_account = account
+        account.state = AccountState.ACTIVE
         
     def view_balance(self, account):
         if account.state == AccountState.ACTIVE:
@@ -104,33 +474,310 @@ class ATM:
             raise Exception("Account Not Logged In")
     
     def deposit(self, account, amount):
+        check_amount(amount)
         if account.state == AccountState.ACTIVE:
-            account.increase_balance(amount)
-            return f"Deposit successful, new balance: {account.balance}"
+            with lock_accounts(account):
+                account.check_amount(amount)
+                self._record(TransactionType.DEPOSIT, account, amount)
+                account.increase_balance(amount)
+                balance = account.balance
+            return f"Deposit successful, new balance: {balance}"
         else:
             raise Exception("Account Not Logged In")
     
     def withdraw(self, account, amount):
+        check_amount(amount)
         if account.state == AccountState.ACTIVE:
-            # check if amount is more than balance
-            if amount > account.balance:
-                raise Exception("Insufficient balance")
-            account.decrease_balance(amount)
-            return f"Withdrawal successful, new balance: {account.balance}"
+            with lock_accounts(account):
+                # check if amount is more than balance
+                if amount > account.balance:
+                    raise Exception("Insufficient balance")
+                account.check_amount(amount)
+                self._record(TransactionType.WITHDRAW, account, amount)
+                account.decrease_balance(amount)
+                balance = account.balance
+            return f"Withdrawal successful, new balance: {balance}"
         else:
             raise Exception("Account Not Logged In")
     
     
     def transfer(self, account, amount, recipient):
+        check_amount(amount)
         if account.state == AccountState.ACTIVE:
-            # check if amount is more than balance
-            if amount > account.balance:
-                raise Exception("Insufficient balance")
-            account.decrease_balance(amount)
-            recipient.increase_balance(amount)
-            return f"Transfer successful, new balance: {account.balance}"
+            with lock_accounts(account, recipient):
+                # check if amount is more than balance
+                if amount > account.balance:
+                    raise Exception("Insufficient balance")
+                account.check_amount(amount)
+                recipient.check_amount(amount)
+                self._record(TransactionType.TRANSFER, account, amount, recipient)
+                account.decrease_balance(amount)
+                recipient.increase_balance(amount)
+                balance = account.balance
+            return f"Transfer successful, new balance: {balance}"
         else:
             raise Exception("Account Not Logged In")
+
+
+def stress_transfer(num_threads=8, num_accounts=100, rounds=5000, hot=False):
+    """
+    Run random transfers from many threads and check that the total
+    balance is conserved and no account goes negative.
+    `hot=True` routes every transfer through the same two accounts.
+    Returns (transfers attempted, seconds).
+    """
+    accounts = [Account(i, 1000) for i in range(num_accounts)]
+    for account in accounts:
+        account.state = AccountState.ACTIVE
+    total_before = sum(account.balance for account in accounts)
+    atm = ATM("stress", "benchmark")
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(rounds):
+            if hot:
+                sender, recipient = rng.sample(accounts[:2], 2)
+            else:
+                sender, recipient = rng.sample(accounts, 2)
+            try:
+                atm.transfer(sender, rng.randint(1, 200), recipient)
+            except Exception:
+                pass  # insufficient balance
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(num_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert sum(account.balance for account in accounts) == total_before, "balance not conserved"
+    assert all(account.balance >= 0 for account in accounts), "negative balance"
+    return num_threads * rounds, elapsed
+
+
+def benchmark_ledger(batch_size, num_threads=64, rounds=100):
+    """
+    Run deposits/withdrawals from many threads through a ledgered ATM and
+    check the ledger rebuilds the same balances. Returns transactions/sec.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.bin")
+        ledger = Ledger(path, batch_size=batch_size)
+        bank = Bank("bench", ledger=ledger)
+        accounts = [bank.open_account(i, 1000) for i in range(num_threads)]
+        for account in accounts:
+            account.state = AccountState.ACTIVE
+        atm = ATM("bench", "benchmark", ledger=ledger)
+
+        def worker(account):
+            for i in range(rounds):
+                if i % 2:
+                    atm.withdraw(account, 1)
+                else:
+                    atm.deposit(account, 2)
+
+        threads = [threading.Thread(target=worker, args=(account,)) for account in accounts]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        ledger.close()
+
+        rebuilt = Ledger.rebuild_balances(path)
+        assert rebuilt == {account.account_id: account.balance for account in accounts}
+        return num_threads * rounds / elapsed
+
+
+class ATMServer:
+    """
+    Serves many remote terminals from one process. Each connection is a
+    terminal with its own ATM session; requests and responses are one JSON
+    object per line:
+        {"op": "login", "card_number": ..., "pin": ...}
+        {"op": "balance"} | {"op": "deposit", "amount": ...}
+        {"op": "withdraw", "amount": ...}
+        {"op": "transfer", "amount": ..., "recipient_id": ...}
+        {"op": "logout"}
+    Blocking work (PIN hashing, account locks, ledger fsync) runs in worker
+    threads so one slow terminal never stalls the event loop.
+    """
+    def __init__(self, bank, ledger=None, idle_timeout=60.0):
+        self._bank = bank
+        self._ledger = ledger
+        self._idle_timeout = idle_timeout
+        self._server = None
+        self._next_terminal_id = 1
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._handle_terminal, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_terminal(self, reader, writer):
+        atm = ATM(self._next_terminal_id, "remote", ledger=self._ledger, bank=self._bank)
+        self._next_terminal_id += 1
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self._idle_timeout)
+                except asyncio.TimeoutError:
+                    await self._send(writer, {"ok": False, "error": "Session timed out"})
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    # line exceeded the stream limit; the rest of it can't be framed
+                    await self._send(writer, {"ok": False, "error": "Request too long"})
+                    break
+                if not line:
+                    break
+                op = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise Exception("Request must be a JSON object")
+                    op = request.get("op")
+                    result = await asyncio.to_thread(self._dispatch, atm, request)
+                    response = {"ok": True, "result": result}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                await self._send(writer, response)
+                if op == "logout":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, response):
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+
+    def _dispatch(self, atm, request):
+        op = request.get("op")
+        if op == "login":
+            atm.login_with_card_number(request["card_number"], request["pin"])
+            return "Login successful"
+        account = atm.current_account
+        if account is None:
+            raise Exception("Account Not Logged In")
+        if op == "balance":
+            return atm.view_balance(account)
+        if op == "deposit":
+            return atm.deposit(account, request["amount"])
+        if op == "withdraw":
+            return atm.withdraw(account, request["amount"])
+        if op == "transfer":
+            recipient = self._bank.get_account(request["recipient_id"])
+            if recipient is None:
+                raise Exception("Recipient account not found")
+            return atm.transfer(account, request["amount"], recipient)
+        if op == "logout":
+            return "Logged out"
+        raise Exception(f"Unknown operation: {op}")
+
+
+async def load_test(host, port, card_pins, requests_per_terminal=50):
+    """
+    Open one connection per (card_number, pin) and log in; once every
+    terminal is logged in, each issues a mix of balance/deposit/withdraw
+    requests. Returns steady-state (p50, p99) latency in ms.
+    """
+    latencies = []
+    logged_in = 0
+    all_logged_in = asyncio.Event()
+
+    async def terminal(card_number, pin):
+        nonlocal logged_in
+        reader, writer = await asyncio.open_connection(host, port)
+
+        async def call(request):
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        # logins are deliberately slow (PIN hashing), keep them out of the measurement
+        await call({"op": "login", "card_number": card_number, "pin": pin})
+        logged_in += 1
+        if logged_in == len(card_pins):
+            all_logged_in.set()
+        await all_logged_in.wait()
+        for i in range(requests_per_terminal):
+            request = [{"op": "balance"}, {"op": "deposit", "amount": 5}, {"op": "withdraw", "amount": 5}][i % 3]
+            start = time.perf_counter()
+            await call(request)
+            latencies.append((time.perf_counter() - start) * 1000)
+        await call({"op": "logout"})
+        writer.close()
+
+    await asyncio.gather(*(terminal(card_number, pin) for card_number, pin in card_pins))
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def benchmark_settlement(num_accounts=200_000):
+    """
+    Run interest, fees and a batch deposit both per-object and through an
+    AccountStore, check the balances match, and return (object s, store s).
+    """
+    rng = random.Random(0)
+    opening = [rng.randint(-5_000, 5_000_000) for _ in range(num_accounts)]
+    deposit_ids = [rng.randrange(num_accounts) for _ in range(num_accounts // 2)]
+    deposit_amounts = [rng.randint(1, 10_000) for _ in deposit_ids]
+
+    plain = {i: Account(i, amount) for i, amount in enumerate(opening)}
+    start = time.perf_counter()
+    apply_interest(plain.values(), 125)
+    apply_fee(plain.values(), 300)
+    batch_deposit(plain, deposit_ids, deposit_amounts)
+    object_seconds = time.perf_counter() - start
+
+    bank = Bank("settlement", store=AccountStore(capacity=num_accounts))
+    for i, amount in enumerate(opening):
+        bank.open_account(i, amount)
+    start = time.perf_counter()
+    bank.store.apply_interest(125)
+    bank.store.apply_fee(300)
+    bank.store.batch_deposit(deposit_ids, deposit_amounts)
+    store_seconds = time.perf_counter() - start
+
+    assert all(bank.get_account(i).balance == account.balance for i, account in plain.items())
+    return object_seconds, store_seconds
+
+
+async def _run_server_benchmark(num_terminals=200):
+    bank = Bank("bench")
+    card_pins = []
+    for i in range(num_terminals):
+        account = bank.open_account(i, 1000)
+        bank.issue_card(f"card-{i}", "0000", account)
+        card_pins.append((f"card-{i}", "0000"))
+    server = ATMServer(bank)
+    host, port = await server.start()
+    p50, p99 = await load_test(host, port, card_pins)
+    await server.stop()
+    return p50, p99
+
+
+if __name__ == "__main__":
+    for hot in (False, True):
+        for threads in (1, 2, 4, 8):
+            ops, elapsed = stress_transfer(num_threads=threads, hot=hot)
+            label = "hot pair" if hot else "disjoint"
+            print(f"{label}, {threads} threads: {ops / elapsed:,.0f} transfers/sec, total conserved")
+    for batch_size in (1, 8, 64, 256):
+        print(f"ledger batch {batch_size}: {benchmark_ledger(batch_size):,.0f} tx/sec")
+    if np is not None:
+        object_seconds, store_seconds = benchmark_settlement()
+        print(f"settlement: per-object {object_seconds:.3f}s, AccountStore {store_seconds:.3f}s, identical balances")
+    p50, p99 = asyncio.run(_run_server_benchmark())
+    print(f"ATMServer, 200 terminals: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
         
     
     
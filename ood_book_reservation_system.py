@@ -17,34 +17,94 @@ Follow-up Questions
 
 """
 from typing import Optional
-from collections import deque
+from collections import Counter, defaultdict, deque
+from enum import Enum
+import heapq
+import itertools
+import re
+import threading
+import time
+import traceback
+
+
+NGRAM = 3
+MIN_PREFIX = 3  # shorter terms would fan out to most of the vocabulary
+
+
+def _words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _ngrams(word):
+    """Trigrams of the word padded on both sides, so short words still have grams."""
+    padded = " " * (NGRAM - 1) + word + " "
+    return [padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)]
+
+
+def _max_typos(word):
+    return 0 if len(word) <= 3 else 1 if len(word) <= 6 else 2
+
+
+def _bounded_edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it must exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class Priority(Enum):
+    # lower value is served first
+    STAFF = 0
+    PREMIUM = 1
+    REGULAR = 2
+
+
 class Resource:
     def __init__(self, title, resource_id, quantity=1):
         self.title = title
         self.resource_id = resource_id
         self.quantity = quantity
         self.reserved_count = 0
-        self.waiting_queue = deque()
+        self.waiting_queue = []  # heap of (priority, arrival, user): by tier, FIFO within a tier
+        self.waiting_users = set()  # user_ids in waiting_queue, so nobody queues twice
+        self._arrivals = itertools.count()
+        self.holds = {}  # user_id -> deadline for promoted waiters who haven't collected yet
+        # serializes every check-and-update of this resource's counts and queue;
+        # reentrant so the manager can hold it across its own bookkeeping
+        self.lock = threading.RLock()
         
     def reserve(self, user):
-        if self.reserved_count < self.quantity:
-            self.reserved_count += 1
-            return True
-        else:
-            self.waiting_queue.append(user)
+        with self.lock:
+            if self.reserved_count < self.quantity:
+                self.reserved_count += 1
+                return True
+            if user.user_id not in self.waiting_users:
+                self.waiting_users.add(user.user_id)
+                heapq.heappush(self.waiting_queue, (user.priority.value, next(self._arrivals), user))
             return False
     
-    def release(self, user) -> Optional[User]:
-        if self.reserved_count > 0:
-            self.reserved_count -= 1
-            
-            if self.waiting_queue:
-                next_user = self.waiting_queue.popleft()
-                self.reserved_count += 1
-                return next_user
-        return None
+    def release(self, user) -> Optional["User"]:
+        with self.lock:
+            if self.reserved_count > 0:
+                self.reserved_count -= 1
+
+                if self.waiting_queue:
+                    _, _, next_user = heapq.heappop(self.waiting_queue)
+                    self.waiting_users.discard(next_user.user_id)
+                    self.reserved_count += 1
+                    return next_user
+            return None
     
     def is_available(self):
+        # unlocked read; may be momentarily stale but never torn
         return self.reserved_count < self.quantity
     
 
@@ -60,65 +120,304 @@ class CD(Resource):
     pass
 
 class User:
-    def __init__(self, name, user_id):
+    def __init__(self, name, user_id, priority=Priority.REGULAR):
         self.name = name
         self.user_id = user_id
-        self.reserved_resources = []
+        self.priority = priority
+        self.reserved_resources = {}  # resource_id -> Resource
+
+
+
+class EventType(Enum):
+    RESERVED = "reserved"
+    WAITLISTED = "waitlisted"
+    RELEASED = "released"
+    PROMOTED = "promoted"
+
+
+class ReservationEvent:
+    def __init__(self, seq, event_type, resource_id, user_id):
+        self.seq = seq  # bus-wide, increasing; gaps tell a consumer it missed events
+        self.event_type = event_type
+        self.resource_id = resource_id
+        self.user_id = user_id
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        return f"ReservationEvent({self.seq}, {self.event_type.name}, {self.resource_id!r}, {self.user_id!r})"
+
+
+class OverflowPolicy(Enum):
+    DROP_OLDEST = "drop_oldest"  # keep the newest events
+    DROP_NEWEST = "drop_newest"  # keep what is already queued
+    BLOCK = "block"  # make publishers wait for room, up to block_timeout, then drop the new event
+
+
+class Subscription:
+    """A bounded ring buffer of events for one consumer, drained in batches."""
+    def __init__(self, capacity, batch_size, policy, block_timeout):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0  # events this consumer never saw
+        self.errors = 0  # batches whose callback raised; delivery carries on
+        self._buffer = deque(maxlen=capacity if policy == OverflowPolicy.DROP_OLDEST else None)
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _offer(self, event):
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                if self.policy == OverflowPolicy.DROP_OLDEST:
+                    self.dropped += 1  # deque(maxlen) evicts the oldest on append
+                elif self.policy == OverflowPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif not self._cond.wait_for(lambda: len(self._buffer) < self.capacity or self._closed,
+                                             timeout=self.block_timeout) or self._closed:
+                    self.dropped += 1
+                    return
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def poll(self, timeout=None):
+        """
+        Wait until a full batch is ready (or timeout passes) and return up
+        to batch_size events, oldest first.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._buffer) >= self.batch_size or self._closed, timeout=timeout)
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._cond.notify_all()  # wake publishers blocked on a full buffer
+            return batch
 
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class EventBus:
+    """
+    In-process fan-out of reservation changes. Each subscriber gets its own
+    bounded buffer, so a slow consumer only ever affects itself (with BLOCK,
+    it also holds up publishers). Events are numbered and queued under one
+    lock, so every subscriber sees seq in increasing order.
+    """
+    def __init__(self):
+        self._subscriptions = []
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()  # guards the subscription list
+        self._publish_lock = threading.Lock()  # numbers and enqueues one event at a time
+
+    def subscribe(self, callback=None, capacity=1024, batch_size=64,
+                  policy=OverflowPolicy.DROP_OLDEST, block_timeout=1.0, flush_interval=0.1):
+        """
+        Register a consumer. Without a callback, drain it with
+        Subscription.poll(); with one, a daemon thread calls
+        callback(batch) every batch_size events or flush_interval seconds.
+        """
+        subscription = Subscription(capacity, batch_size, policy, block_timeout)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        if callback is not None:
+            def deliver():
+                while not subscription._closed:
+                    batch = subscription.poll(timeout=flush_interval)
+                    if batch:
+                        try:
+                            callback(batch)
+                        except Exception:
+                            # keep draining: a dead thread would leave BLOCK publishers stalled
+                            subscription.errors += 1
+                            traceback.print_exc()
+            threading.Thread(target=deliver, daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+        subscription.close()
+
+    def publish(self, event_type, resource_id, user_id):
+        subscriptions = self._subscriptions  # copy-on-write list, safe to read unlocked
+        if not subscriptions:
+            return
+        with self._publish_lock:
+            event = ReservationEvent(next(self._seq), event_type, resource_id, user_id)
+            for subscription in subscriptions:
+                subscription._offer(event)
 
 
 # New ResourceManager class to handle business logic
 class ResourceManager:
-    def __init__(self):
-        self.resources = []
-        self.users = []
+    def __init__(self, hold_window=48 * 3600, clock=time.monotonic):
+        self.resources = {}  # resource_id -> Resource
+        self.users = {}  # user_id -> User
+        self.hold_window = hold_window  # seconds a promoted waiter has to collect
+        self._clock = clock
+        self._hold_heap = []  # (deadline, resource_id, user_id); stale entries are skipped
+        self._hold_lock = threading.Lock()  # taken after a resource lock, never before
+        self.events = EventBus()
+        self._word_index = defaultdict(set)  # title word -> {resource_id}
+        self._ngram_index = defaultdict(set)  # trigram -> {title word}
     
     def add_resource(self, resource):
-        self.resources.append(resource)
+        if resource.resource_id in self.resources:
+            return False
+        self.resources[resource.resource_id] = resource
+        for word in set(_words(resource.title)):
+            if word not in self._word_index:
+                for gram in _ngrams(word):
+                    self._ngram_index[gram].add(word)
+            self._word_index[word].add(resource.resource_id)
         return True
+
+    def _match_word(self, term):
+        """Return {title word: score} for words equal to, starting with, or a few typos from term."""
+        if len(term) < MIN_PREFIX:
+            return {term: 1.0} if term in self._word_index else {}
+        limit = _max_typos(term)
+        grams = _ngrams(term)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._ngram_index.get(gram, ()))
+        # q-gram lemma: a word within `limit` edits shares at least this many grams
+        min_shared = len(grams) - NGRAM * limit
+        matches = {}
+        for word, count in shared.items():
+            if word == term:
+                matches[word] = 1.0
+            elif count >= len(term) and word.startswith(term):
+                matches[word] = 0.8
+            elif count >= min_shared and abs(len(word) - len(term)) <= limit:
+                distance = _bounded_edit_distance(term, word, limit)
+                if distance <= limit:
+                    matches[word] = 0.7 - 0.2 * distance
+        return matches
+
+    def search(self, text, k=10):
+        """
+        Rank resources by how well their titles match the query words,
+        allowing prefixes and a few typos per word. Words shorter than
+        MIN_PREFIX count as prefixes only for resources the longer words
+        found; a query of only short words matches them exactly.
+        """
+        terms = set(_words(text))
+        long_terms = {term for term in terms if len(term) >= MIN_PREFIX}
+        scores = defaultdict(float)
+        for term in long_terms or terms:
+            best = {}
+            for word, score in self._match_word(term).items():
+                for resource_id in self._word_index[word]:
+                    best[resource_id] = max(best.get(resource_id, 0.0), score)
+            for resource_id, score in best.items():
+                scores[resource_id] += score
+        if long_terms:
+            # short prefixes fan out to most of the vocabulary; only score the candidates
+            for term in terms - long_terms:
+                for resource_id in scores:
+                    words = _words(self.resources[resource_id].title)
+                    scores[resource_id] += max((1.0 if word == term else 0.8
+                                                for word in words if word.startswith(term)), default=0.0)
+        top = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], self.resources[item[0]].title))
+        return [self.resources[resource_id] for resource_id, _ in top]
     
     def add_user(self, user):
-        self.users.append(user)
+        if user.user_id in self.users:
+            return False
+        self.users[user.user_id] = user
         return True
     
     def get_user(self, user_id):
-        for user in self.users:
-            if user.user_id == user_id:
-                return user
-        return None
+        return self.users.get(user_id)
     
     def search_resource(self, resource_id):
-        for resource in self.resources:
-            if resource.resource_id == resource_id:
-                return resource
-        return None
+        return self.resources.get(resource_id)
     
     def reserve_resource(self, resource_id, user_id):
+        self.expire_holds()
         resource = self.search_resource(resource_id)
         user = self.get_user(user_id)
         
         if not resource or not user:
             return False
         
-        if resource.reserve(user):
-            user.reserved_resources.append(resource)
-            return True
-        else:
-            return False
+        with resource.lock:
+            if resource_id in user.reserved_resources:
+                return False  # already holds a copy
+            was_waiting = user_id in resource.waiting_users
+            if resource.reserve(user):
+                user.reserved_resources[resource_id] = resource
+                self.events.publish(EventType.RESERVED, resource_id, user_id)
+                return True
+            else:
+                if not was_waiting:
+                    self.events.publish(EventType.WAITLISTED, resource_id, user_id)
+                return False
     
     def release_resource(self, resource_id, user_id):
+        self.expire_holds()
         resource = self.search_resource(resource_id)
         user = self.get_user(user_id)
         
-        if not resource or not user or resource not in user.reserved_resources:
+        if not resource or not user:
             return False
         
-        user.reserved_resources.remove(resource)
+        with resource.lock:
+            if resource_id not in user.reserved_resources:
+                return False
+            self._release(resource, user)
+        return True
+
+    def _release(self, resource, user):
+        """Give up the user's copy and put the next waiter on hold for it. Caller holds resource.lock."""
+        del user.reserved_resources[resource.resource_id]
+        resource.holds.pop(user.user_id, None)
         next_user = resource.release(user)
+        self.events.publish(EventType.RELEASED, resource.resource_id, user.user_id)
 
         if next_user:
-            next_user.reserved_resources.append(resource)
-        return True
+            next_user.reserved_resources[resource.resource_id] = resource
+            self.events.publish(EventType.PROMOTED, resource.resource_id, next_user.user_id)
+            deadline = self._clock() + self.hold_window
+            resource.holds[next_user.user_id] = deadline
+            with self._hold_lock:
+                heapq.heappush(self._hold_heap, (deadline, resource.resource_id, next_user.user_id))
+
+    def collect_resource(self, resource_id, user_id):
+        """Turn a hold into a confirmed reservation before it expires."""
+        self.expire_holds()
+        resource = self.search_resource(resource_id)
+        if not resource:
+            return False
+        with resource.lock:
+            return resource.holds.pop(user_id, None) is not None
+
+    def expire_holds(self, now=None):
+        """
+        Expire holds whose window has passed and promote the next waiter.
+        Only due entries are touched, so this is cheap to call on every request.
+        """
+        now = self._clock() if now is None else now
+        expired = []
+        while True:
+            with self._hold_lock:
+                if not self._hold_heap or self._hold_heap[0][0] > now:
+                    break
+                deadline, resource_id, user_id = heapq.heappop(self._hold_heap)
+            resource = self.resources.get(resource_id)
+            if resource is None:
+                continue
+            with resource.lock:
+                # skip holds that were collected, released or replaced since
+                if resource.holds.get(user_id) != deadline:
+                    continue
+                self._release(resource, self.users[user_id])
+            expired.append((resource_id, user_id))
+        return expired
 
 
 # Library class as interface layer(Facade Pattern, Encapsulation)
@@ -136,6 +435,9 @@ class Library:
     # Search interfaces
     def search_resource(self, resource_id):
         return self.manager.search_resource(resource_id)
+
+    def search(self, text, k=10):
+        return self.manager.search(text, k)
     
     # Reservation interfaces
     def reserve_resource(self, resource_id, user_id):
@@ -143,4 +445,56 @@ class Library:
     
     def release_resource(self, resource_id, user_id):
         return self.manager.release_resource(resource_id, user_id)
-        
\ No newline at end of file
+
+    def collect_resource(self, resource_id, user_id):
+        return self.manager.collect_resource(resource_id, user_id)
+
+    # Change notification interfaces
+    def subscribe(self, callback=None, **options):
+        return self.manager.events.subscribe(callback, **options)
+
+
+def benchmark_contention(num_threads=8, rounds=2000, hot=True, quantity=2):
+    """
+    Each thread reserves and releases as its own user. `hot=True` sends all
+    threads at one title with `quantity` copies; otherwise every thread has
+    its own title. Checks no copy was oversubscribed. Returns reservations/sec.
+    """
+    manager = ResourceManager()
+    titles = 1 if hot else num_threads
+    for i in range(titles):
+        manager.add_resource(Book(f"Title {i}", "Author", f"isbn-{i}", quantity=quantity))
+    users = [User(f"user-{i}", i) for i in range(num_threads)]
+    for user in users:
+        manager.add_user(user)
+    oversubscribed = []
+
+    def worker(user):
+        resource_id = f"isbn-{user.user_id % titles}"
+        resource = manager.search_resource(resource_id)
+        for _ in range(rounds):
+            manager.reserve_resource(resource_id, user.user_id)
+            if resource.reserved_count > resource.quantity:
+                oversubscribed.append(resource.reserved_count)
+            manager.release_resource(resource_id, user.user_id)
+
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert not oversubscribed, f"copies oversubscribed: {oversubscribed[:10]}"
+    for resource in manager.resources.values():
+        holders = sum(resource.resource_id in user.reserved_resources for user in users)
+        assert resource.reserved_count == holders <= resource.quantity
+    return num_threads * rounds / elapsed
+
+
+if __name__ == "__main__":
+    for threads in (1, 4, 16):
+        hot = benchmark_contention(num_threads=threads, hot=True)
+        cold = benchmark_contention(num_threads=threads, hot=False)
+        print(f"{threads} threads: hot title {hot:,.0f} reservations/sec, cold titles {cold:,.0f} reservations/sec")
@@ -29,7 +29,20 @@ Follow up:
 
 """
 
+import csv
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
 from enum import Enum
+from itertools import islice
 
 class BookStatus(Enum):
     AVAILABLE = 1
@@ -37,24 +50,78 @@ class BookStatus(Enum):
     RESERVED = -1
     
 
+def _tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _in_posting(posting, book_id):
+    """Membership in a live id set or a sorted mapped id array."""
+    if isinstance(posting, set):
+        return book_id in posting
+    i = bisect_left(posting, book_id)
+    return i < len(posting) and posting[i] == book_id
+
+
+def _count_hits(postings, book_ids, hits):
+    """Add 1 to hits[b] for every b in book_ids found in any of postings, walking the smaller side."""
+    if sum(map(len, postings)) <= len(book_ids):
+        found = set().union(*postings) & book_ids
+    else:
+        found = [b for b in book_ids if any(_in_posting(p, b) for p in postings)]
+    for book_id in found:
+        hits[book_id] += 1
+
+
+def _edge_gram(prefix):
+    """Space-padded gram for a 1-2 character word start, e.g. "  h" or " ha"."""
+    return " " * (3 - len(prefix)) + prefix
+
+
+def _index_grams(token):
+    # inner trigrams for substring matches, plus edge grams so short prefixes resolve
+    return _trigrams(token) | {_edge_gram(token[:n]) for n in (1, 2) if len(token) >= n}
+
+
 class Book:
-    def __init__(self, title, author, book_id):
+    def __init__(self, title, author, book_id, library=None):
         self._book_id = book_id
         self._title = title
         self._author = author
         self._status = BookStatus.AVAILABLE
         self._current_borrower = None
+        self._library = library  # notified on status changes
+
+    def _set_status(self, status):
+        self._status = status
+        if self._library is not None:
+            self._library._on_status_change(self)
 
     def mark_borrowed(self, borrower):
         """Mark book as borrowed."""
         self._current_borrower = borrower
-        self._status = BookStatus.BORROWED
+        self._set_status(BookStatus.BORROWED)
         
     def mark_returned(self):
         """Mark book as returned."""
         self._current_borrower = None
-        self._status = BookStatus.AVAILABLE
+        self._set_status(BookStatus.AVAILABLE)
         
+    @property
+    def book_id(self):
+        return self._book_id
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def author(self):
+        return self._author
+
     @property
     def status(self):
         return self._status
@@ -68,53 +135,282 @@ class Member:
     def __init__(self, name):
         self._name = name
         self._member_id = None
-        self._borrowed_books = []
+        self._borrowed_books = {}  # book_id -> Book, in borrow order
 
     def register(self, member_id):
         """Register this member with an ID."""
         self._member_id = member_id
 
+    @property
+    def member_id(self):
+        return self._member_id
+
+    @property
+    def name(self):
+        return self._name
+
     def add_book(self, book):
-        self._borrowed_books.append(book)
+        self._borrowed_books[book.book_id] = book
         
     def remove_book(self, book):
-        if book in self._borrowed_books:
-            self._borrowed_books.remove(book)
+        if self._borrowed_books.get(book.book_id) is book:
+            del self._borrowed_books[book.book_id]
             return True
         return False
 
     def list_books(self):
-        return self._borrowed_books
+        """Read-only live view of borrowed books."""
+        return self._borrowed_books.values()
 
 
 class Library:
-    def __init__(self):
-        self._books = []
-        self._members = []
+    def __init__(self, lock_stripes=64):
+        self._catalog_lock = threading.Lock()  # guards catalog, member and index writes
+        self._book_locks = [threading.Lock() for _ in range(lock_stripes)]  # striped by book_id
+        self._books = {}  # book_id -> Book
+        self._members = {}  # member_id -> Member
+        self._available = {}  # book_id -> Book, kept in sync by Book status changes
+        self._loans = {}  # book_id -> Member currently holding it
+        self._token_index = defaultdict(set)  # token -> {book_id}, on top of any base index
+        self._trigram_index = defaultdict(set)  # trigram -> {token}
+        self._base_index = None  # read-only _MappedIndex from a loaded snapshot
+        self._unindexed = set()  # book ids removed since the base index was written
         self._next_book_id = 1
+        self._log = None  # LibraryStore recording mutations, if attached
         
     def add_book(self, title, author):
-        book = Book(title, author, self._next_book_id)
-        self._books.append(book)
-        self._next_book_id += 1
-        return book
+        return self.add_books([(title, author)])[0]
     
+    def add_books(self, records):
+        """
+        Add many books under a single catalog lock. `records` yields
+        (title, author) pairs or dicts with "title" and "author" keys.
+        """
+        added = []
+        with self._catalog_lock:
+            for record in records:
+                if isinstance(record, dict):
+                    title, author = record["title"], record["author"]
+                else:
+                    title, author = record
+                book = self._insert_book(self._next_book_id, title, author)
+                if self._log:
+                    self._log.log_add_book(book)
+                added.append(book)
+        return added
+
+    def _insert_book(self, book_id, title, author):
+        book = Book(title, author, book_id, library=self)
+        self._books[book_id] = book
+        self._available[book_id] = book
+        self._index_book(book)
+        self._next_book_id = max(self._next_book_id, book_id + 1)
+        return book
+
+    def add_books_from_file(self, path):
+        """Stream books from a CSV (title,author header) or JSONL file."""
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                records = (json.loads(line) for line in f if line.strip())
+            else:
+                records = csv.DictReader(f)
+            return self.add_books(records)
+
     def remove_book(self, book_id):
-        for book in self._books[:]:
-            if book._book_id == book_id:
-                self._books.remove(book)
-                return True
-        return False
+        with self._book_lock(book_id), self._catalog_lock:
+            book = self._books.pop(book_id, None)
+            if book is None:
+                return False
+            self._available.pop(book_id, None)
+            borrower = self._loans.pop(book_id, None)
+            if borrower is not None:
+                borrower.remove_book(book)  # a withdrawn book no longer counts as a loan
+            self._unindex_book(book)
+            book._library = None
+            if self._log:
+                self._log.log_remove_book(book_id)
+        return True
+
+    def _book_lock(self, book_id):
+        return self._book_locks[book_id % len(self._book_locks)]
+
+    def _index_book(self, book):
+        for token in set(_tokenize(book.title) + _tokenize(book.author)):
+            if token not in self._token_index:
+                for gram in _index_grams(token):
+                    self._trigram_index[gram].add(token)
+            self._token_index[token].add(book.book_id)
+
+    def _unindex_book(self, book):
+        if self._base_index is not None:
+            self._unindexed.add(book.book_id)  # the mapped postings can't change
+        for token in set(_tokenize(book.title) + _tokenize(book.author)):
+            book_ids = self._token_index.get(token)
+            if book_ids is None:
+                continue
+            book_ids.discard(book.book_id)
+            if book_ids:
+                continue
+            del self._token_index[token]
+            for gram in _index_grams(token):
+                self._trigram_index[gram].discard(token)
+                if not self._trigram_index[gram]:
+                    del self._trigram_index[gram]
+
+    def _gram_tokens(self, gram):
+        """Tokens holding `gram`: (live token strings, base index token ids)."""
+        base = self._base_index.gram_tokens(gram) if self._base_index is not None else ()
+        return self._trigram_index.get(gram, ()), base
+
+    def _matching_tokens(self, term):
+        """
+        Return indexed tokens containing `term` (or starting with it, for
+        short terms) as (live token strings, base index token ids).
+        """
+        if len(term) < 3:
+            # too short for inner trigrams: match as a word prefix
+            live, base = self._gram_tokens(_edge_gram(term))
+            return set(live), set(base)
+        postings = sorted((self._gram_tokens(gram) for gram in _trigrams(term)),
+                          key=lambda pair: len(pair[0]) + len(pair[1]))
+        live, base = set(postings[0][0]), set(postings[0][1])
+        for more_live, more_base in postings[1:]:
+            live.intersection_update(more_live)
+            base.intersection_update(more_base)
+            if not live and not base:
+                break
+        base_tokens = self._base_index.token if base else None
+        return ({token for token in live if term in token},
+                {token_id for token_id in base if term in base_tokens(token_id)})
+
+    def _term_postings(self, term):
+        """Posting lists of every token matching `term`: live id sets, sorted mapped id arrays."""
+        live, base = self._matching_tokens(term)
+        postings = [self._token_index[token] for token in live]
+        postings += [self._base_index.token_books(token_id) for token_id in base]
+        return postings
+
+    def _exact_postings(self, term):
+        postings = [self._token_index.get(term, set())]
+        if self._base_index is not None:
+            postings.append(self._base_index.books(term))
+        return postings
+
+    def _with_prefix(self, prefix, book_ids):
+        """Keep the books with a word starting with `prefix`, walking the cheaper side."""
+        live, base = self._gram_tokens(_edge_gram(prefix))
+        if len(live) + len(base) <= 32 * len(book_ids):  # each token has at least one book
+            postings = self._term_postings(prefix)
+            if sum(map(len, postings)) <= 32 * len(book_ids):
+                return book_ids & set().union(*postings)
+        kept = set()
+        for book_id in book_ids:
+            book = self._books.get(book_id)
+            if book and any(word.startswith(prefix) for word in _tokenize(f"{book.title} {book.author}")):
+                kept.add(book_id)
+        return kept
+
+    def search(self, query, limit=10):
+        """
+        Search titles and authors; every query term must match a word
+        exactly or as a substring. Terms under 3 characters match a word
+        prefix among the books the longer terms found; a query of only
+        such terms matches them as whole words. Books matching more terms
+        exactly rank first.
+        """
+        terms = _tokenize(query)
+        if not terms:
+            return []
+        long_terms = [term for term in terms if len(term) >= 3]
+        if long_terms:
+            # short prefixes fan out to most of the vocabulary; only use them to filter
+            by_size = [self._term_postings(term) for term in long_terms]
+        else:
+            by_size = [self._exact_postings(term) for term in terms]
+        # most selective term first; a much larger term only probes the survivors
+        by_size.sort(key=lambda ps: sum(map(len, ps)))
+        matches = set().union(*by_size[0])
+        for postings in by_size[1:]:
+            if not matches:
+                return []
+            if sum(map(len, postings)) > 8 * len(matches):
+                matches = {b for b in matches if any(_in_posting(p, b) for p in postings)}
+            else:
+                matches &= set().union(*postings)
+        if long_terms:
+            for term in terms:
+                if len(term) < 3 and matches:
+                    matches = self._with_prefix(term, matches)
+        if self._unindexed:
+            matches -= self._unindexed
+        if not matches:
+            return []
+        if not long_terms:
+            ranked = heapq.nsmallest(limit, matches)  # every match is exact on every term
+            return [self._books[book_id] for book_id in ranked]
+        exact_hits = defaultdict(int)
+        for term in terms:
+            _count_hits(self._exact_postings(term), matches, exact_hits)
+        ranked = heapq.nsmallest(limit, matches, key=lambda book_id: (-exact_hits[book_id], book_id))
+        return [self._books[book_id] for book_id in ranked]
+
+    def get_book(self, book_id):
+        return self._books.get(book_id)
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def _is_registered(self, member, book):
+        """Check that both objects are the ones this library has on record."""
+        return (self._members.get(member.member_id) is member
+                and self._books.get(book.book_id) is book)
+
+    def _on_status_change(self, book):
+        """Keep the availability index in sync with a book's status."""
+        if book.status == BookStatus.AVAILABLE:
+            self._available[book.book_id] = book
+        else:
+            self._available.pop(book.book_id, None)
+        if book.current_borrower is None:
+            self._loans.pop(book.book_id, None)
+        else:
+            self._loans[book.book_id] = book.current_borrower
+
+    def get_borrower(self, book_id):
+        """Return the member holding the book, or None."""
+        return self._loans.get(book_id)
+
+    def get_member_books(self, member_id):
+        """Return a read-only view of the member's loans, or None for unknown members."""
+        member = self._members.get(member_id)
+        return member.list_books() if member else None
 
     def get_available_books(self):
-        return [book for book in self._books if book.status == BookStatus.AVAILABLE]
+        return list(self._available.values())
+
+    def count_available_books(self):
+        return len(self._available)
+
+    def iter_available_books(self, offset=0, limit=None):
+        """
+        Return one page of available books, skipping `offset` and stopping
+        after `limit`. Only the page's ids are copied out, so concurrent
+        borrows can't invalidate the walk; books borrowed meanwhile are dropped.
+        """
+        stop = None if limit is None else offset + limit
+        book_ids = list(islice(self._available, offset, stop))
+        books = map(self._available.get, book_ids)
+        return [book for book in books if book is not None]
     
     def register_member(self, name):
         """Register a new member with the library."""
         member = Member(name)
-        member_id = self._generate_member_id()
-        member.register(member_id)
-        self._members.append(member)
+        with self._catalog_lock:
+            member_id = self._generate_member_id()
+            member.register(member_id)
+            self._members[member_id] = member
+            if self._log:
+                self._log.log_register_member(member)
         return member
 
     def _generate_member_id(self):
@@ -122,22 +418,611 @@ class Library:
     
     def borrow_book(self, member, book):
         """Process a book borrowing request from a member."""
-        if member not in self._members or book not in self._books:
-            return False
-            
+        # status check and update must be atomic per book
+        with self._book_lock(book.book_id):
+            if not self._is_registered(member, book):
+                return False
+            borrowed = self._try_borrow(member, book)
+        if self._log:
+            self._log.maybe_checkpoint()
+        return borrowed
+
+    def return_book(self, member, book):
+        """Process a book return from a member."""
+        with self._book_lock(book.book_id):
+            if not self._is_registered(member, book):
+                return False
+            returned = self._try_return(member, book)
+        if self._log:
+            self._log.maybe_checkpoint()
+        return returned
+
+    def borrow_many(self, member, books):
+        """Borrow several books for one member. Returns a success flag per book."""
+        return self._apply_many(member, books, self._try_borrow)
+
+    def return_many(self, member, books):
+        """Return several books for one member. Returns a success flag per book."""
+        return self._apply_many(member, books, self._try_return)
+
+    def _apply_many(self, member, books, action):
+        books = list(books)
+        results = [False] * len(books)
+        if self._members.get(member.member_id) is not member:
+            return results
+
+        # group by lock stripe so each stripe is acquired once per batch
+        by_stripe = defaultdict(list)
+        for i, book in enumerate(books):
+            by_stripe[book.book_id % len(self._book_locks)].append(i)
+        for stripe, positions in by_stripe.items():
+            with self._book_locks[stripe]:
+                for i in positions:
+                    book = books[i]
+                    if self._books.get(book.book_id) is book:
+                        results[i] = action(member, book)
+        if self._log:
+            self._log.maybe_checkpoint()
+        return results
+
+    def _try_borrow(self, member, book):
         if book.status == BookStatus.AVAILABLE:
             member.add_book(book)
             book.mark_borrowed(member)
+            if self._log:
+                self._log.log_borrow(book, member)
             return True
         return False
 
-    def return_book(self, member, book):
-        """Process a book return from a member."""
-        if member not in self._members or book not in self._books:
-            return False
-            
+    def _try_return(self, member, book):
         if book.status == BookStatus.BORROWED and book.current_borrower == member:
             member.remove_book(book)
             book.mark_returned()
+            if self._log:
+                self._log.log_return(book, member)
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+class _SnapshotMap:
+    """
+    Dict-like id -> object map backed by ids in a mapped snapshot. Objects
+    are built by `load(id)` on first access, so opening a store costs
+    nothing per record. Ids set after loading live in a plain dict;
+    iteration follows dict order: surviving snapshot ids, then new ones.
+    """
+    def __init__(self, ids, load, contains):
+        self._ids = ids  # snapshot ids, in iteration order
+        self._load = load  # id -> object, for ids in the snapshot
+        self._contains = contains  # id -> whether the snapshot holds it
+        self._loaded = {}  # snapshot id -> object built so far
+        self._removed = set()  # snapshot ids popped since loading
+        self._added = {}  # ids set since loading, in insertion order
+        self._load_lock = threading.Lock()  # one object per id, even under races
+
+    def _in_snapshot(self, key):
+        return key not in self._removed and self._contains(key)
+
+    def get(self, key, default=None):
+        if key in self._added:
+            return self._added[key]
+        if not self._in_snapshot(key):
+            return default
+        value = self._loaded.get(key)
+        if value is None:
+            with self._load_lock:
+                value = self._loaded.get(key)
+                if value is None:
+                    value = self._loaded[key] = self._load(key)
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def built(self, key):
+        """The object for `key` if it was added or already loaded, without loading it."""
+        value = self._added.get(key)
+        return self._loaded.get(key) if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, value):
+        if key not in self._added and self._in_snapshot(key):
+            self._loaded[key] = value  # keeps its snapshot position, like a dict
+        else:
+            self._added[key] = value
+
+    def pop(self, key, default=None):
+        if key in self._added:
+            return self._added.pop(key)
+        if not self._in_snapshot(key):
+            return default
+        value = self.get(key)
+        self._removed.add(key)
+        self._loaded.pop(key, None)
+        return value
+
+    def __len__(self):
+        return len(self._ids) - len(self._removed) + len(self._added)
+
+    def __iter__(self):
+        removed = self._removed
+        for key in self._ids:
+            if key not in removed:
+                yield key
+        yield from list(self._added)
+
+    def values(self):
+        for key in self:
+            value = self.get(key)
+            if value is not None:
+                yield value
+
+
+class _MappedStrings:
+    """Sequence of utf-8 strings sliced out of a mapped heap; bisect works on it when sorted."""
+    def __init__(self, heap, offsets):
+        self._heap = heap
+        self._offsets = offsets  # string i is heap[offsets[i]:offsets[i + 1]]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self._heap[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+class _MappedIndex:
+    """
+    Read-only search index over a mapped snapshot: sorted tokens with a
+    sorted posting list of book ids each, and sorted grams listing the ids of the
+    tokens that contain them. Lookups bisect the sorted strings.
+    """
+    def __init__(self, tokens, posting_offsets, postings, grams, gram_offsets, gram_tokens):
+        self._tokens = tokens
+        self._posting_offsets = posting_offsets
+        self._postings = postings
+        self._grams = grams
+        self._gram_offsets = gram_offsets
+        self._gram_tokens = gram_tokens
+
+    @staticmethod
+    def _find(strings, key):
+        i = bisect_left(strings, key)
+        return i if i < len(strings) and strings[i] == key else None
+
+    def tokens(self):
+        return iter(self._tokens)
+
+    def grams(self):
+        """Yield (gram, ids of tokens containing it), grams in sorted order."""
+        for i in range(len(self._grams)):
+            yield self._grams[i], self._gram_tokens[self._gram_offsets[i]:self._gram_offsets[i + 1]]
+
+    def token(self, token_id):
+        return self._tokens[token_id]
+
+    def token_books(self, token_id):
+        return self._postings[self._posting_offsets[token_id]:self._posting_offsets[token_id + 1]]
+
+    def books(self, token):
+        token_id = self._find(self._tokens, token)
+        return () if token_id is None else self.token_books(token_id)
+
+    def gram_tokens(self, gram):
+        i = self._find(self._grams, gram)
+        return () if i is None else self._gram_tokens[self._gram_offsets[i]:self._gram_offsets[i + 1]]
+
+
+class LibraryStore:
+    """
+    Persists a Library as a binary snapshot plus an append-only operation log.
+
+    Snapshot layout (little endian, u32 arrays after the header):
+        header: magic, generation, next_book_id, #books, #members, #loans,
+                #available, #tokens, #postings, #grams, #gram entries
+        book_ids (sorted), book string offsets (title, author per book)
+        member_ids (sorted), member string offsets (name per member)
+        loans: book_id, member_id pairs
+        available book ids, in the library's availability order
+        token string offsets (tokens sorted), posting offsets, postings (book ids)
+        gram string offsets (grams sorted), gram entry offsets, gram entries (token ids)
+        string heap: utf-8 text addressed by the offsets
+    Opening maps the snapshot and materializes only loaned books and their
+    borrowers; every other book and member is built from the mapped arrays
+    on first access, and searches read the mapped index directly.
+    Log layout: header (magic, generation) then records of
+        op, id, id [, strings]
+    A log whose generation is older than the snapshot's was already folded
+    into the snapshot and is ignored on load.
+    """
+    SNAPSHOT_MAGIC = b"LIBS"
+    LOG_MAGIC = b"LIBL"
+    _HEADER = struct.Struct("<4sQIIIIIIIII")
+    _LOG_HEADER = struct.Struct("<4sQ")
+    _RECORD = struct.Struct("<BII")
+    _STR_LEN = struct.Struct("<H")
+
+    OP_ADD_BOOK = 1
+    OP_REMOVE_BOOK = 2
+    OP_REGISTER_MEMBER = 3
+    OP_BORROW = 4
+    OP_RETURN = 5
+
+    def __init__(self, snapshot_path, log_path, compact_every=100_000, fsync=False):
+        self._snapshot_path = snapshot_path
+        self._log_path = log_path
+        self._compact_every = compact_every
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        self._library = None
+        self._log_file = None
+        self._generation = 0
+        self._ops_since_snapshot = 0
+        self._snapshot_buf = None  # mmap backing lazily loaded books and members
+        self._base_books = None  # (ids, string offsets, heap) of the loaded snapshot
+        self._base_members = None
+
+    def open(self):
+        """Load the snapshot, replay the log tail and start logging to it."""
+        library = Library()
+        if os.path.exists(self._snapshot_path):
+            self._load_snapshot(library)
+        valid_end = self._replay_log(library) if os.path.exists(self._log_path) else None
+        self._library = library
+        if valid_end is None:
+            self._open_log(truncate=True)
+        else:
+            # drop any torn record so new appends start on a record boundary
+            os.truncate(self._log_path, valid_end)
+            self._open_log(truncate=False)
+        library._log = self
+        return library
+
+    def close(self):
+        if self._log_file:
+            self._sync()
+            self._log_file.close()
+            self._log_file = None
+        if self._library:
+            self._library._log = None
+
+    # ---- logging hooks called by Library ----
+
+    def log_add_book(self, book):
+        self._append(self.OP_ADD_BOOK, book.book_id, 0, book.title, book.author)
+
+    def log_remove_book(self, book_id):
+        self._append(self.OP_REMOVE_BOOK, book_id, 0)
+
+    def log_register_member(self, member):
+        self._append(self.OP_REGISTER_MEMBER, member.member_id, 0, member.name)
+
+    def log_borrow(self, book, member):
+        self._append(self.OP_BORROW, book.book_id, member.member_id)
+
+    def log_return(self, book, member):
+        self._append(self.OP_RETURN, book.book_id, member.member_id)
+
+    def _append(self, op, first_id, second_id, *strings):
+        record = self._RECORD.pack(op, first_id, second_id) + b"".join(self._pack_str(s) for s in strings)
+        with self._lock:
+            self._log_file.write(record)
+            self._ops_since_snapshot += 1
+            if self._fsync:
+                self._sync()
+
+    def maybe_checkpoint(self):
+        """Compact once enough operations have piled up. Call with no Library locks held."""
+        if self._ops_since_snapshot >= self._compact_every:
+            self.checkpoint()
+
+    # ---- snapshot / compaction ----
+
+    def checkpoint(self):
+        """Write a fresh snapshot and start an empty log generation."""
+        library = self._library
+        # same order as remove_book: book stripes, then catalog, then the log
+        for lock in library._book_locks:
+            lock.acquire()
+        try:
+            with library._catalog_lock, self._lock:
+                self._generation += 1
+                self._write_snapshot(library)
+                self._open_log(truncate=True)
+                self._ops_since_snapshot = 0
+        finally:
+            for lock in library._book_locks:
+                lock.release()
+
+    def _write_snapshot(self, library):
+        loans = array("I")
+        for book_id, member in library._loans.items():
+            loans.extend((book_id, member.member_id))
+        available = array("I", library._available)
+        tokens, posting_offsets, postings, grams, gram_offsets, gram_tokens = self._merged_index(library)
+        heap = bytearray()
+        book_ids, book_offsets = self._pack_records(library._books, ("title", "author"), self._base_books, heap)
+        member_ids, member_offsets = self._pack_records(library._members, ("name",), self._base_members, heap)
+        token_str_offsets = array("I", [len(heap)])
+        for token in tokens:
+            heap += token.encode("utf-8")
+            token_str_offsets.append(len(heap))
+        gram_str_offsets = array("I", [len(heap)])
+        for gram in grams:
+            heap += gram.encode("utf-8")
+            gram_str_offsets.append(len(heap))
+        tmp_path = self._snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._HEADER.pack(self.SNAPSHOT_MAGIC, self._generation, library._next_book_id,
+                                      len(book_ids), len(member_ids), len(loans) // 2, len(available),
+                                      len(tokens), len(postings), len(grams), len(gram_tokens)))
+            for ids in (book_ids, book_offsets, member_ids, member_offsets,
+                        loans, available, token_str_offsets, posting_offsets, postings,
+                        gram_str_offsets, gram_offsets, gram_tokens):
+                f.write(ids.tobytes())
+            f.write(heap)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+
+    @staticmethod
+    def _pack_records(records, fields, base, heap):
+        """
+        Append each record's string fields to `heap`; return (sorted ids, offsets).
+        Records never touched since loading are copied as raw bytes from the
+        old snapshot instead of being built.
+        """
+        ids = array("I", sorted(records))
+        offsets = array("I", [len(heap)])
+        built = records.built if isinstance(records, _SnapshotMap) else records.get
+        for key in ids:
+            record = built(key)
+            if record is None:
+                base_ids, base_offsets, base_heap = base
+                i = len(fields) * bisect_left(base_ids, key)
+                for j in range(i, i + len(fields)):
+                    heap += base_heap[base_offsets[j]:base_offsets[j + 1]]
+                    offsets.append(len(heap))
+            else:
+                for field in fields:
+                    heap += getattr(record, field).encode("utf-8")
+                    offsets.append(len(heap))
+        return ids, offsets
+
+    @staticmethod
+    def _merged_index(library):
+        """
+        Fold the live index into the base one: sorted tokens with sorted
+        postings, and sorted grams with token ids. Base tokens keep their
+        grams, renumbered; only tokens new since loading are split into grams.
+        """
+        base, live, unindexed = library._base_index, library._token_index, library._unindexed
+        live_tokens = sorted(live)
+        tokens, posting_offsets, postings = [], array("I", [0]), array("I")
+        renumber = []  # base token id -> new token id, or -1 once it has no books left
+        new_grams = defaultdict(list)  # gram -> new ids of tokens not in the base
+
+        def add_token(token, base_id):
+            if base_id is not None:
+                book_ids = base.token_books(base_id)
+                postings.extend(book_ids if not unindexed else
+                                [book_id for book_id in book_ids if book_id not in unindexed])
+            if token in live:
+                # ids added since loading are all newer, so the list stays sorted
+                postings.extend(sorted(live[token]))
+            token_id = -1
+            if len(postings) > posting_offsets[-1]:
+                token_id = len(tokens)
+                tokens.append(token)
+                posting_offsets.append(len(postings))
+                if base_id is None:
+                    for gram in _index_grams(token):
+                        new_grams[gram].append(token_id)
+            if base_id is not None:
+                renumber.append(token_id)
+
+        j = 0
+        for base_id, token in enumerate(base.tokens() if base else ()):
+            while j < len(live_tokens) and live_tokens[j] < token:
+                add_token(live_tokens[j], None)
+                j += 1
+            if j < len(live_tokens) and live_tokens[j] == token:
+                j += 1
+            add_token(token, base_id)
+        for token in live_tokens[j:]:
+            add_token(token, None)
+
+        same_ids = renumber == list(range(len(renumber)))
+        grams, gram_offsets, gram_tokens = [], array("I", [0]), array("I")
+
+        def add_gram(gram, base_token_ids):
+            if same_ids:
+                gram_tokens.extend(base_token_ids)
+            else:
+                gram_tokens.extend(renumber[t] for t in base_token_ids if renumber[t] >= 0)
+            gram_tokens.extend(new_grams.get(gram, ()))
+            if len(gram_tokens) > gram_offsets[-1]:
+                grams.append(gram)
+                gram_offsets.append(len(gram_tokens))
+
+        new_sorted = sorted(new_grams)
+        k = 0
+        for gram, base_token_ids in (base.grams() if base else ()):
+            while k < len(new_sorted) and new_sorted[k] < gram:
+                add_gram(new_sorted[k], ())
+                k += 1
+            if k < len(new_sorted) and new_sorted[k] == gram:
+                k += 1
+            add_gram(gram, base_token_ids)
+        for gram in new_sorted[k:]:
+            add_gram(gram, ())
+        return tokens, posting_offsets, postings, grams, gram_offsets, gram_tokens
+
+    def _load_snapshot(self, library):
+        with open(self._snapshot_path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, generation, next_book_id, n_books, n_members, n_loans, n_available,
+         n_tokens, n_postings, n_grams, n_gram_entries) = self._HEADER.unpack_from(buf, 0)
+        if magic != self.SNAPSHOT_MAGIC:
+            raise ValueError(f"{self._snapshot_path} is not a library snapshot")
+        view = memoryview(buf)
+        start = self._HEADER.size
+        arrays = []
+        for length in (n_books, 2 * n_books + 1, n_members, n_members + 1, 2 * n_loans, n_available,
+                       n_tokens + 1, n_tokens + 1, n_postings, n_grams + 1, n_grams + 1, n_gram_entries):
+            end = start + 4 * length
+            arrays.append(view[start:end].cast("I"))
+            start = end
+        (book_ids, book_offsets, member_ids, member_offsets, loans, available,
+         token_str_offsets, posting_offsets, postings, gram_str_offsets, gram_offsets, gram_tokens) = arrays
+        heap = view[start:]
+        if len(heap) < gram_str_offsets[-1]:  # the heap ends with the gram strings
+            raise ValueError(f"{self._snapshot_path} is truncated")
+
+        def find(ids, key):
+            i = bisect_left(ids, key)
+            return i if i < len(ids) and ids[i] == key else None
+
+        def load_book(book_id):
+            i = 2 * find(book_ids, book_id)
+            title = str(heap[book_offsets[i]:book_offsets[i + 1]], "utf-8")
+            author = str(heap[book_offsets[i + 1]:book_offsets[i + 2]], "utf-8")
+            return Book(title, author, book_id, library=library)
+
+        def load_member(member_id):
+            i = find(member_ids, member_id)
+            member = Member(str(heap[member_offsets[i]:member_offsets[i + 1]], "utf-8"))
+            member.register(member_id)
+            return member
+
+        def has_book(book_id):
+            return find(book_ids, book_id) is not None
+
+        def has_member(member_id):
+            return find(member_ids, member_id) is not None
+
+        loaned = set(loans[::2])
+        library._books = _SnapshotMap(book_ids, load_book, has_book)
+        library._members = _SnapshotMap(member_ids, load_member, has_member)
+        library._available = _SnapshotMap(available, library._books.get,
+                                          lambda book_id: book_id not in loaned and has_book(book_id))
+        library._base_index = _MappedIndex(_MappedStrings(heap, token_str_offsets), posting_offsets, postings,
+                                           _MappedStrings(heap, gram_str_offsets), gram_offsets, gram_tokens)
+        for i in range(0, len(loans), 2):
+            library._try_borrow(library._members[loans[i + 1]], library._books[loans[i]])
+        library._next_book_id = max(library._next_book_id, next_book_id)
+        self._generation = generation
+        self._snapshot_buf = buf
+        self._base_books = (book_ids, book_offsets, heap)
+        self._base_members = (member_ids, member_offsets, heap)
+
+    def _replay_log(self, library):
+        """Apply the log tail; return the offset after the last whole record, or None to start fresh."""
+        with open(self._log_path, "rb") as f:
+            data = f.read()
+        if len(data) < self._LOG_HEADER.size:
+            return None
+        magic, generation = self._LOG_HEADER.unpack_from(data, 0)
+        if magic != self.LOG_MAGIC:
+            raise ValueError(f"{self._log_path} is not a library log")
+        if generation != self._generation:
+            return None  # already folded into the snapshot
+        offset = valid_end = self._LOG_HEADER.size
+        try:
+            while offset < len(data):
+                op, first_id, second_id = self._RECORD.unpack_from(data, offset)
+                offset += self._RECORD.size
+                if op == self.OP_ADD_BOOK:
+                    title, offset = self._unpack_str(data, offset)
+                    author, offset = self._unpack_str(data, offset)
+                    library._insert_book(first_id, title, author)
+                elif op == self.OP_REMOVE_BOOK:
+                    library.remove_book(first_id)
+                elif op == self.OP_REGISTER_MEMBER:
+                    name, offset = self._unpack_str(data, offset)
+                    self._restore_member(library, first_id, name)
+                elif op == self.OP_BORROW:
+                    library._try_borrow(library._members[second_id], library._books[first_id])
+                elif op == self.OP_RETURN:
+                    library._try_return(library._members[second_id], library._books[first_id])
+                self._ops_since_snapshot += 1
+                valid_end = offset
+        except struct.error:
+            pass  # torn record at the tail from a crash mid-write
+        return valid_end
+
+    def _open_log(self, truncate):
+        if self._log_file:
+            self._log_file.close()
+        if truncate:
+            self._log_file = open(self._log_path, "wb")
+            self._log_file.write(self._LOG_HEADER.pack(self.LOG_MAGIC, self._generation))
+            self._sync()
+        else:
+            self._log_file = open(self._log_path, "ab")
+
+    def _sync(self):
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+
+    @staticmethod
+    def _restore_member(library, member_id, name):
+        member = Member(name)
+        member.register(member_id)
+        library._members[member_id] = member
+
+    @classmethod
+    def _pack_str(cls, text):
+        raw = text.encode("utf-8")
+        return cls._STR_LEN.pack(len(raw)) + raw
+
+    @classmethod
+    def _unpack_str(cls, buf, offset):
+        (length,) = cls._STR_LEN.unpack_from(buf, offset)
+        start = offset + cls._STR_LEN.size
+        if start + length > len(buf):
+            raise struct.error("truncated string")
+        return bytes(buf[start:start + length]).decode("utf-8"), start + length
+
+
+def stress_borrow(num_threads=8, num_books=100, rounds=2000):
+    """
+    Hammer borrow/return from many threads and verify no book is ever
+    held by two members at once. Returns (operations, seconds).
+    """
+    library = Library()
+    books = [library.add_book(f"Book {i}", "Author") for i in range(num_books)]
+    members = [library.register_member(f"Member {i}") for i in range(num_threads)]
+    double_borrows = []
+
+    def worker(member, seed):
+        for i in range(rounds):
+            book = books[(seed * 7919 + i) % num_books]
+            if library.borrow_book(member, book):
+                if book.current_borrower is not member:
+                    double_borrows.append(book.book_id)
+                library.return_book(member, book)
+
+    threads = [threading.Thread(target=worker, args=(member, i)) for i, member in enumerate(members)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    assert not double_borrows, f"double borrows detected: {double_borrows[:10]}"
+    assert library.count_available_books() == num_books
+    assert all(not member.list_books() for member in members)
+    return num_threads * rounds, elapsed
+
+
+if __name__ == "__main__":
+    for threads in (1, 2, 4, 8):
+        ops, elapsed = stress_borrow(num_threads=threads)
+        print(f"{threads} threads: {ops / elapsed:,.0f} borrow attempts/sec, no double borrows")
\ No newline at end of file
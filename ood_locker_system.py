@@ -116,10 +116,17 @@ workflow:
 """
 
 from enum import Enum
+import asyncio
+import bisect
+import heapq
+import itertools
+import math
 import random
 import string
-from typing import Dict, Optional, List, Tuple
-import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, List, Set, Tuple
 
 
 class LockerSize(Enum):
@@ -128,109 +135,524 @@ class LockerSize(Enum):
     LARGE = 3
 
 
+Dimensions = Tuple[int, int, int]
+
+# default (length, width, depth) of a size class when no dimensions are given
+SIZE_DIMENSIONS: Dict[LockerSize, Dimensions] = {
+    LockerSize.SMALL: (12, 12, 12),
+    LockerSize.MEDIUM: (18, 18, 18),
+    LockerSize.LARGE: (24, 24, 24),
+}
+
+
+def _stack_height(package_dims: Dimensions, locker_dims: Dimensions) -> Optional[int]:
+    """Least height a package takes stacked along the locker's longest side, or None if it can't fit."""
+    x, y, z = package_dims
+    a, b, _ = locker_dims
+    for height, (p, q) in ((x, (y, z)), (y, (x, z)), (z, (x, y))):
+        if p <= a and q <= b:
+            return height
+    return None
+
+
 class Package:
     """Represents a package to be stored in a locker"""
-    def __init__(self, size: LockerSize, user_id: str):
+    def __init__(self, size: LockerSize, user_id: str, length: Optional[int] = None,
+                 width: Optional[int] = None, depth: Optional[int] = None):
         self._size = size
         self._user_id = user_id
+        dims = (length, width, depth) if length is not None else SIZE_DIMENSIONS[size]
+        self._dimensions: Dimensions = tuple(sorted(dims))  # smallest side first
+        self._volume = dims[0] * dims[1] * dims[2]
+
+    @property
+    def size(self) -> LockerSize:
+        return self._size
+
+    @property
+    def user_id(self) -> str:
+        return self._user_id
+
+    @property
+    def dimensions(self) -> Dimensions:
+        return self._dimensions
+
+    @property
+    def volume(self) -> int:
+        return self._volume
 
 
 class Locker:
-    """Represents a locker that can store a single package"""
-    def __init__(self, size: LockerSize):
+    """
+    Represents a locker that can store several packages of the same user.
+    Packages are stacked along the locker's longest side, each turned so it
+    takes the least stack height that still fits the cross-section.
+    """
+    def __init__(self, size: LockerSize, length: Optional[int] = None,
+                 width: Optional[int] = None, depth: Optional[int] = None):
         self._size = size
-        self._package: Optional[Package] = None  # Only one package allowed
+        dims = (length, width, depth) if length is not None else SIZE_DIMENSIONS[size]
+        self._dimensions: Dimensions = tuple(sorted(dims))  # smallest side first
+        self._volume = dims[0] * dims[1] * dims[2]
+        self._packages: Dict[Package, int] = {}  # package -> stack height it uses
+        self._user_id: Optional[str] = None  # owner of every package inside
+        self._used_height = 0
+        self._used_volume = 0
         self._code: Optional[str] = None
         self._is_locked: bool = False
-    
+
+    @property
+    def size(self) -> LockerSize:
+        return self._size
+
+    @property
+    def dimensions(self) -> Dimensions:
+        return self._dimensions
+
+    @property
+    def packages(self) -> List[Package]:
+        return list(self._packages)
+
+    @property
+    def user_id(self) -> Optional[str]:
+        return self._user_id
+
+    @property
+    def remaining_volume(self) -> int:
+        return self._volume - self._used_volume
+
+    @property
+    def code(self) -> Optional[str]:
+        return self._code
+
+    def expire_code(self) -> None:
+        # packages stay inside, but the code no longer opens the locker
+        self._code = None
+        self._is_locked = True
+
     def generate_combo(self) -> str:
         return ''.join(random.choices(string.digits, k=4))
-    
+
     def lock(self) -> Optional[str]:
-        # Locker generates a code when it is locked
-        if self._package:
+        # Locker generates a code the first time it is locked and keeps it
+        # until it is emptied, so one code opens all of a user's packages
+        if self._packages:
             self._is_locked = True
-            self._code = self.generate_combo()
+            if self._code is None:
+                self._code = self.generate_combo()
             return self._code
         return None
-    
+
     def unlock(self, code: str) -> bool:
         # Locker unlocks when the code is correct
-        if self._code == code:
+        if self._code is not None and self._code == code:
             self._is_locked = False
             return True
         return False
-    
+
     def is_available(self) -> bool:
-        return self._package is None
-    
+        return not self._packages
+
+    def _stack_height(self, package: Package) -> Optional[int]:
+        """Least height the package can take in the stack, or None if it can't fit the cross-section."""
+        return _stack_height(package.dimensions, self._dimensions)
+
     def can_store_package(self, package: Package) -> bool:
-        return self.is_available() and self._size.value >= package.size.value
-    
+        if self._user_id is not None and package.user_id != self._user_id:
+            return False
+        # O(1) bounds first, stacking check only if they pass
+        if package.volume > self.remaining_volume:
+            return False
+        if any(p > l for p, l in zip(package.dimensions, self._dimensions)):
+            return False
+        height = self._stack_height(package)
+        return height is not None and self._used_height + height <= self._dimensions[2]
+
     def store_package(self, package: Package) -> Optional[str]:
         if self.can_store_package(package):
-            self._package = package
-            return self.lock()
+            return self._stack(package, self._stack_height(package))
         return None
-    
-    def retrieve_package(self) -> Optional[Package]:
-        if not self.is_available():
-            package = self._package
-            self._package = None
+
+    def _stack(self, package: Package, height: int) -> str:
+        """Store a package already known to fit, taking `height` of the stack."""
+        self._packages[package] = height
+        self._user_id = package.user_id
+        self._used_height += height
+        self._used_volume += package.volume
+        return self.lock()
+
+    def retrieve_package(self, package: Optional[Package] = None) -> Optional[Package]:
+        if self.is_available():
+            return None
+        if package is None:
+            package = next(iter(self._packages))
+        if package not in self._packages:
+            return None
+        self._used_height -= self._packages.pop(package)
+        self._used_volume -= package.volume
+        if self._packages:
+            self.lock()
+        else:
+            self._user_id = None
             self._is_locked = False
             self._code = None
-            return package
-        return None
+        return package
 
 
 class LockerCenter:
-    def __init__(self):
-        self._lockers: List[Locker] = []
+    def __init__(self, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._ttl = ttl  # seconds a code stays valid after its latest package; None: never expires
+        self._clock = clock
+        self._lockers: Set[Locker] = set()
         self._package_to_locker: Dict[Package, Locker] = {}  # Maps package objects to locker objects
+        self._user_packages: Dict[str, Dict[Package, Locker]] = {}  # user_id -> {package: locker}
+        self._user_lockers: Dict[str, Dict[Locker, int]] = {}  # user_id -> {locker: packages held}
+        # empty lockers bucketed by shape; dicts keep insertion order so allocation is deterministic
+        self._free_lockers: Dict[Dimensions, Dict[Locker, None]] = {}
+        self._shapes: List[Tuple[int, Dimensions]] = []  # (volume, shape), smallest first
+        # (deadline, ticket, locker) per stored package; stale entries are skipped when popped
+        self._expiry_heap: List[Tuple[float, int, Locker]] = []
+        self._tickets = itertools.count()
+        self._locker_ticket: Dict[Locker, int] = {}  # latest ticket of each occupied locker
+        self._to_return: Dict[Locker, None] = {}  # lockers with expired codes awaiting return-to-sender
+        self._expiry_listeners: List[Callable[[Locker, List[Package]], None]] = []
 
     def add_locker(self, locker: Locker) -> None:
-        self._lockers.append(locker)
-    
+        self._lockers.add(locker)
+        if locker.is_available():
+            self._mark_free(locker)
+
     def remove_locker(self, locker: Locker) -> bool:
         if locker in self._lockers:
             self._lockers.remove(locker)
+            self._free_lockers.get(locker.dimensions, {}).pop(locker, None)
+            self._to_return.pop(locker, None)
+            self._locker_ticket.pop(locker, None)
+            # packages in a removed locker are no longer reachable through this center
+            for package in locker.packages:
+                self._unindex_package(package)
             return True
         return False
-    
+
+    def _mark_free(self, locker: Locker) -> None:
+        shape = locker.dimensions
+        if shape not in self._free_lockers:
+            self._free_lockers[shape] = {}
+            bisect.insort(self._shapes, (shape[0] * shape[1] * shape[2], shape))
+        self._free_lockers[shape][locker] = None
+
+    def _index_package(self, package: Package, locker: Locker) -> None:
+        self._package_to_locker[package] = locker
+        self._user_packages.setdefault(package.user_id, {})[package] = locker
+        user_lockers = self._user_lockers.setdefault(package.user_id, {})
+        user_lockers[locker] = user_lockers.get(locker, 0) + 1
+
+    def _unindex_package(self, package: Package) -> None:
+        locker = self._package_to_locker.pop(package, None)
+        user_packages = self._user_packages.get(package.user_id)
+        if user_packages is not None:
+            user_packages.pop(package, None)
+            if not user_packages:
+                del self._user_packages[package.user_id]
+        user_lockers = self._user_lockers.get(package.user_id)
+        if user_lockers is not None and locker in user_lockers:
+            user_lockers[locker] -= 1
+            if not user_lockers[locker]:
+                del user_lockers[locker]
+            if not user_lockers:
+                del self._user_lockers[package.user_id]
+
     def dropoff(self, package: Package) -> Optional[Tuple[Locker, str]]:
         locker = self.find_optimal_locker(package)
         if locker:
-            code = locker.store_package(package)
-            self._package_to_locker[package] = locker
-            return locker, code
+            return locker, self._store(package, locker)
         return None
-    
+
+    def _store(self, package: Package, locker: Locker, height: Optional[int] = None) -> str:
+        if locker.is_available():
+            del self._free_lockers[locker.dimensions][locker]
+        code = locker.store_package(package) if height is None else locker._stack(package, height)
+        if self._ttl is not None:
+            # every package restarts the shared code's deadline; the older
+            # ticket goes stale and is skipped when it reaches the heap top
+            ticket = next(self._tickets)
+            self._locker_ticket[locker] = ticket
+            heapq.heappush(self._expiry_heap, (self._clock() + self._ttl, ticket, locker))
+        self._index_package(package, locker)
+        return code
+
+    def dropoff_batch(self, packages: List[Package]) -> List[Optional[Tuple[Locker, str]]]:
+        """
+        Place a whole delivery at once. A new user's packages first try the
+        smallest empty locker that holds all of them, so they share one locker
+        instead of spreading over several; whatever is left goes largest
+        volume first with best fit, so early small parcels never take the
+        lockers a later large parcel needs. Results line up with `packages`.
+        """
+        results: List[Optional[Tuple[Locker, str]]] = [None] * len(packages)
+        by_user: Dict[str, List[int]] = {}
+        for i, package in enumerate(packages):
+            by_user.setdefault(package.user_id, []).append(i)
+        rest = []
+        for user_id, positions in by_user.items():
+            plan = None
+            if len(positions) > 1 and user_id not in self._user_lockers:
+                plan = self._group_locker([packages[i] for i in positions])
+            if plan is None:
+                rest.extend(positions)
+                continue
+            locker, heights = plan
+            for i, height in zip(positions, heights):
+                results[i] = (locker, self._store(packages[i], locker, height))
+        rest.sort(key=lambda i: (-packages[i].volume, packages[i].user_id))
+        for i in rest:
+            results[i] = self.dropoff(packages[i])
+        return results
+
+    def _group_locker(self, group: List[Package]) -> Optional[Tuple[Locker, List[int]]]:
+        """The smallest empty locker that stacks the whole group, with each package's stack height."""
+        for _, shape in self._shapes:
+            lockers = self._free_lockers[shape]
+            if not lockers:
+                continue
+            heights = [_stack_height(package.dimensions, shape) for package in group]
+            if None not in heights and sum(heights) <= shape[2]:
+                return next(iter(lockers)), heights
+        return None
+
     def find_optimal_locker(self, package: Package) -> Optional[Locker]:
-        candidates = []
-        for locker in self._lockers:
-            if locker.can_store_package(package):
-                heapq.heappush(candidates, (locker.size.value, locker))
-        if candidates:
-            return heapq.heappop(candidates)[1] # return the locker with the smallest size
+        # top up one of the user's own lockers first, tightest fit wins
+        best = None
+        for locker in self._user_lockers.get(package.user_id, ()):
+            if locker.can_store_package(package) and (best is None or locker.remaining_volume < best.remaining_volume):
+                best = locker
+        if best:
+            return best
+        # otherwise the smallest empty locker shape that fits
+        for volume, shape in self._shapes:
+            lockers = self._free_lockers[shape]
+            if volume >= package.volume and lockers and all(p <= l for p, l in zip(package.dimensions, shape)):
+                return next(iter(lockers))
         return None
     
     def retrieve(self, user_id: str) -> List[Tuple[Package, Locker]]:
-        user_packages = []
-        for package, locker in self._package_to_locker.items():
-            if package.user_id == user_id:
-                user_packages.append((package, locker))
-        return user_packages
+        return list(self._user_packages.get(user_id, {}).items())
     
     def checkout(self, package: Package, code: str) -> Optional[Package]:
         locker = self._package_to_locker.get(package)
-        if locker:
-            if not locker.is_available() and locker.package == package:
-                if locker.unlock(code):
-                    retrieved_package = locker.retrieve_package()
-                    if retrieved_package:
-                        del self._package_to_locker[package]
-                        return retrieved_package
+        if locker and locker.unlock(code):
+            retrieved_package = locker.retrieve_package(package)
+            if retrieved_package:
+                self._unindex_package(package)
+                if locker.is_available():
+                    self._locker_ticket.pop(locker, None)
+                    if locker in self._lockers:
+                        self._mark_free(locker)
+                return retrieved_package
         return None
 
-        
+    def subscribe_expiry(self, listener: Callable[[Locker, List[Package]], None]) -> None:
+        """Call `listener(locker, packages)` whenever a locker's code expires, e.g. to notify the users."""
+        self._expiry_listeners.append(listener)
+
+    def expire(self, now: Optional[float] = None) -> List[Locker]:
+        """
+        Expire every code whose deadline has passed and flag its locker for
+        return-to-sender. Work is proportional to the codes that expired.
+        """
+        now = self._clock() if now is None else now
+        expired = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, ticket, locker = heapq.heappop(self._expiry_heap)
+            # skip tickets superseded by a later store or cleared when the locker emptied
+            if self._locker_ticket.get(locker) != ticket or locker not in self._lockers:
+                continue
+            del self._locker_ticket[locker]
+            packages = locker.packages
+            locker.expire_code()
+            for package in packages:
+                self._unindex_package(package)
+            self._to_return[locker] = None
+            expired.append(locker)
+            for listener in self._expiry_listeners:
+                listener(locker, packages)
+        return expired
+
+    def lockers_to_return(self) -> List[Locker]:
+        return list(self._to_return)
+
+    def return_to_sender(self, locker: Locker) -> List[Package]:
+        """Empty a flagged locker for the courier and put it back into service."""
+        if locker not in self._to_return:
+            return []
+        del self._to_return[locker]
+        packages = [locker.retrieve_package(package) for package in locker.packages]
+        if locker in self._lockers:
+            self._mark_free(locker)
+        return packages
+
+    async def run_expiry(self, interval: float = 1.0) -> None:
+        """Background task: `asyncio.create_task(center.run_expiry())`."""
+        while True:
+            self.expire()
+            await asyncio.sleep(interval)
+
+
+class LockerNetwork:
+    """
+    Many locker sites, each its own LockerCenter. A dropoff goes to the
+    requested site first and falls back to the other sites nearest to it.
+    Each site has its own lock, so different sites can be served from
+    different threads.
+    """
+    def __init__(self, max_workers: Optional[int] = None):
+        self._sites: Dict[str, LockerCenter] = {}
+        self._locations: Dict[str, Tuple[float, float]] = {}
+        self._site_locks: Dict[str, threading.Lock] = {}
+        self._nearest: Dict[str, List[str]] = {}  # site -> other sites, nearest first
+        self._max_workers = max_workers
+
+    def add_site(self, site_id: str, location: Tuple[float, float],
+                 center: Optional[LockerCenter] = None) -> LockerCenter:
+        center = center or LockerCenter()
+        self._sites[site_id] = center
+        self._locations[site_id] = location
+        self._site_locks[site_id] = threading.Lock()
+        # sites are added rarely and dropoffs are frequent, so precompute the orderings
+        for site in self._sites:
+            others = [other for other in self._sites if other != site]
+            others.sort(key=lambda other: math.dist(self._locations[site], self._locations[other]))
+            self._nearest[site] = others
+        return center
+
+    def get_site(self, site_id: str) -> Optional[LockerCenter]:
+        return self._sites.get(site_id)
+
+    def dropoff(self, site_id: str, package: Package,
+                max_fallback: Optional[int] = None) -> Optional[Tuple[str, Locker, str]]:
+        """Returns (site_id, locker, code) from the first site with room, or None."""
+        for site in self._candidate_sites(site_id, max_fallback):
+            with self._site_locks[site]:
+                result = self._sites[site].dropoff(package)
+            if result:
+                return (site,) + result
+        return None
 
+    def _candidate_sites(self, site_id: str, max_fallback: Optional[int]) -> List[str]:
+        fallback = self._nearest[site_id]
+        return [site_id] + (fallback if max_fallback is None else fallback[:max_fallback])
+
+    def dropoff_many(self, requests: List[Tuple[str, Package]],
+                     max_fallback: Optional[int] = None) -> List[Optional[Tuple[str, Locker, str]]]:
+        """
+        Place many (site_id, package) requests. Each site's own requests run
+        as one dropoff_batch in a worker pool; whatever does not fit then
+        falls back to nearby sites one package at a time.
+        """
+        results: List[Optional[Tuple[str, Locker, str]]] = [None] * len(requests)
+        by_site: Dict[str, List[int]] = {}
+        for i, (site_id, _) in enumerate(requests):
+            by_site.setdefault(site_id, []).append(i)
+
+        def place_at_site(site_id: str) -> None:
+            positions = by_site[site_id]
+            with self._site_locks[site_id]:
+                placed = self._sites[site_id].dropoff_batch([requests[i][1] for i in positions])
+            for i, result in zip(positions, placed):
+                if result:
+                    results[i] = (site_id,) + result
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            list(pool.map(place_at_site, by_site))
+
+        for i, (site_id, package) in enumerate(requests):
+            if results[i] is None:
+                for site in self._candidate_sites(site_id, max_fallback)[1:]:
+                    with self._site_locks[site]:
+                        result = self._sites[site].dropoff(package)
+                    if result:
+                        results[i] = (site,) + result
+                        break
+        return results
+
+
+
+
+def benchmark_batch_dropoff(num_lockers: int = 3000, num_routes: int = 50, seed: int = 0,
+                            repeat: int = 3) -> None:
+    """Compare per-package greedy dropoff with dropoff_batch on the same random routes."""
+    def build_center() -> LockerCenter:
+        rng = random.Random(seed)
+        center = LockerCenter()
+        for _ in range(num_lockers):
+            center.add_locker(Locker(rng.choice(list(LockerSize))))
+        return center
+
+    def parcel(rng: random.Random, user_id: str) -> Package:
+        # mostly small parcels, each at most its size class and often flat
+        size = rng.choice([LockerSize.SMALL] * 3 + [LockerSize.MEDIUM, LockerSize.LARGE])
+        side = SIZE_DIMENSIONS[size][0]
+        return Package(size, user_id, rng.randint(side // 2, side), rng.randint(side // 2, side),
+                       rng.randint(2, side // 2))
+
+    # 1-4 parcels per customer, shuffled within a route; about two parcels
+    # per locker, so demand outruns capacity and placement decides who is turned away
+    rng = random.Random(seed)
+    routes = []
+    for route_id in range(num_routes):
+        route: List[Package] = []
+        while len(route) < num_lockers * 2 // num_routes:
+            user_id = f"user-{route_id}-{rng.randrange(10 ** 6)}"
+            route += [parcel(rng, user_id) for _ in range(rng.randint(1, 4))]
+        rng.shuffle(route)
+        routes.append(route)
+    total = sum(len(route) for route in routes)
+
+    for name, place in (("greedy", lambda center, route: [center.dropoff(p) for p in route]),
+                        ("batch", lambda center, route: center.dropoff_batch(route))):
+        elapsed = float("inf")
+        for _ in range(repeat):
+            center = build_center()
+            start = time.perf_counter()
+            results = [place(center, route) for route in routes]
+            elapsed = min(elapsed, time.perf_counter() - start)
+        placed = large_rejected = 0
+        for route, route_results in zip(routes, results):
+            for package, result in zip(route, route_results):
+                if result is not None:
+                    placed += 1
+                elif package.size == LockerSize.LARGE:
+                    large_rejected += 1
+        print(f"{name}: placed {placed}/{total} ({placed / total:.1%}), "
+              f"large parcels rejected {large_rejected}, {total / elapsed:,.0f} packages/sec")
+
+
+def benchmark_network(site_counts: Tuple[int, ...] = (1, 4, 16, 64), lockers_per_site: int = 200,
+                      seed: int = 0) -> None:
+    """Network-wide dropoffs/sec as sites grow, one package at a time and through dropoff_many."""
+    for num_sites in site_counts:
+        for mode in ("dropoff", "dropoff_many"):
+            rng = random.Random(seed)
+            network = LockerNetwork()
+            for site in range(num_sites):
+                center = network.add_site(f"site-{site}", (rng.random() * 100, rng.random() * 100))
+                for _ in range(lockers_per_site):
+                    center.add_locker(Locker(rng.choice(list(LockerSize))))
+            # uneven demand: the first sites overflow and have to fall back
+            requests = [(f"site-{min(int(rng.expovariate(4 / num_sites)), num_sites - 1)}",
+                         Package(rng.choice(list(LockerSize)), f"user-{rng.randrange(1000)}"))
+                        for _ in range(lockers_per_site * num_sites * 9 // 10)]
+            start = time.perf_counter()
+            if mode == "dropoff":
+                results = [network.dropoff(site_id, package) for site_id, package in requests]
+            else:
+                results = network.dropoff_many(requests)
+            elapsed = time.perf_counter() - start
+            placed = sum(result is not None for result in results)
+            print(f"{num_sites} sites, {mode}: placed {placed}/{len(requests)}, "
+                  f"{len(requests) / elapsed:,.0f} dropoffs/sec")
+
+
+if __name__ == "__main__":
+    benchmark_batch_dropoff()
+    benchmark_network()
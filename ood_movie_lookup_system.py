@@ -9,12 +9,22 @@ Requirements:
 DS:
 - SortdDict
 - Binary Search on sorted array
+  (FrozenMovieScheduler: int32 date array + CSR offsets into movie ids)
 """
 
 
-from sortedcontainers import SortedDict
+from array import array
+from bisect import bisect_left
 from datetime import date
 from typing import Optional, List
+import csv
+import mmap
+import struct
+
+# sortedcontainers and numpy are imported where used, so the frozen
+# scheduler can start without loading either
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()  # datetime64[D] counts days from here
 
 class Movie:
     def __init__(self, title, show_dates=None):
@@ -25,10 +35,13 @@ class Movie:
 class MovieScheduler:
     def __init__(self):
         """Initialize a movie scheduler with a SortedDict where dates are keys and movie lists are values."""
+        from sortedcontainers import SortedDict
         self.date_to_movies = SortedDict()  # date -> [movies on that date]
+        self._date_index = None  # (ordinals, first movies) built on demand for batch lookups
     
     def add_movie(self, movie):
         """Add a movie with its show dates."""
+        self._date_index = None
         for show_date in movie.show_dates:
             if show_date not in self.date_to_movies:
                 self.date_to_movies[show_date] = []
@@ -77,3 +90,151 @@ class MovieScheduler:
         else:
             return self.date_to_movies[after_date][0]
 
+    def _get_date_index(self):
+        import numpy as np
+        if self._date_index is None:
+            ordinals = np.fromiter((d.toordinal() for d in self.date_to_movies.keys()),
+                                   dtype=np.int64, count=len(self.date_to_movies))
+            first_movies = np.empty(len(self.date_to_movies), dtype=object)
+            first_movies[:] = [movies[0] for movies in self.date_to_movies.values()]
+            self._date_index = (ordinals, first_movies)
+        return self._date_index
+
+    def get_movies_for_dates(self, dates) -> List[Optional[Movie]]:
+        """
+        Batch version of get_movie_for_date with identical tie-breaking.
+        `dates` may be datetime64 values, proleptic ordinals (date.toordinal())
+        or date objects; a single date gives a one-element list.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("get_movies_for_dates requires numpy") from None
+        dates = np.atleast_1d(dates)
+        if np.issubdtype(dates.dtype, np.datetime64):
+            queries = dates.astype("datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+        elif dates.dtype == object:
+            queries = np.fromiter((d.toordinal() for d in dates.ravel()), dtype=np.int64,
+                                  count=dates.size).reshape(dates.shape)
+        else:
+            queries = dates.astype(np.int64)
+        if not self.date_to_movies:
+            return [None] * queries.size
+
+        ordinals, first_movies = self._get_date_index()
+        last = len(ordinals) - 1
+        index = np.searchsorted(ordinals, queries, side="left")
+        before = ordinals[np.maximum(index - 1, 0)]
+        after = ordinals[np.minimum(index, last)]
+        # exact matches land on `index` (after == query); ties go to the earlier date
+        chosen = np.where(queries - before <= after - queries, index - 1, index)
+        chosen = np.where(index == 0, 0, np.where(index > last, last, chosen))
+        return first_movies[chosen].tolist()
+
+
+class FrozenMovieScheduler:
+    """
+    Read-only scheduler compiled into flat int32 arrays:
+        dates[i]                          ordinal of the i-th show date, sorted
+        movie_ids[offsets[i]:offsets[i+1]]  movies on dates[i], in insertion order
+    About 12 bytes per show date instead of a date object, a list and
+    SortedDict bookkeeping. Lookups bisect `dates` with the same
+    tie-breaking as MovieScheduler.
+    """
+    MAGIC = b"MOVS"
+    _HEADER = struct.Struct("<4siii")  # magic, #dates, #entries, #movies
+    _TITLE_LEN = struct.Struct("<H")
+
+    def __init__(self, dates, offsets, movie_ids, titles, buffer=None):
+        self._dates = dates
+        self._offsets = offsets
+        self._movie_ids = movie_ids
+        self._movies = [Movie(title) for title in titles]  # show_dates are not kept
+        self._buffer = buffer  # mmap backing the arrays, if loaded from disk
+
+    @classmethod
+    def from_shows(cls, shows):
+        """Build from (title, date) pairs; a title's first appearance fixes its movie id."""
+        movie_ids = {}
+        pairs = []
+        for title, show_date in shows:
+            movie_id = movie_ids.setdefault(title, len(movie_ids))
+            pairs.append((show_date.toordinal(), movie_id))
+        pairs.sort(key=lambda pair: pair[0])  # stable: keeps insertion order within a date
+
+        dates, offsets, ids = array("i"), array("i"), array("i")
+        for ordinal, movie_id in pairs:
+            if not dates or dates[-1] != ordinal:
+                dates.append(ordinal)
+                offsets.append(len(ids))
+            ids.append(movie_id)
+        offsets.append(len(ids))
+        return cls(dates, offsets, ids, list(movie_ids))
+
+    @classmethod
+    def from_scheduler(cls, scheduler):
+        shows = ((movie.title, show_date)
+                 for show_date, movies in scheduler.date_to_movies.items() for movie in movies)
+        return cls.from_shows(shows)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Bulk build from a CSV of `title,YYYY-MM-DD` rows, one show per row."""
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls.from_shows((title, date.fromisoformat(day)) for title, day in csv.reader(f))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self._HEADER.pack(self.MAGIC, len(self._dates), len(self._movie_ids), len(self._movies)))
+            f.write(array("i", self._dates).tobytes())
+            f.write(array("i", self._offsets).tobytes())
+            f.write(array("i", self._movie_ids).tobytes())
+            for movie in self._movies:
+                raw = movie.title.encode("utf-8")
+                f.write(self._TITLE_LEN.pack(len(raw)) + raw)
+
+    @classmethod
+    def load(cls, path):
+        """Map a saved index; the int arrays are read straight from the page cache."""
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_dates, n_entries, n_movies = cls._HEADER.unpack_from(buffer, 0)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not a frozen movie schedule")
+        view = memoryview(buffer)
+        start = cls._HEADER.size
+        arrays = []
+        for length in (n_dates, n_dates + 1, n_entries):
+            end = start + 4 * length
+            arrays.append(view[start:end].cast("i"))
+            start = end
+        titles = []
+        for _ in range(n_movies):
+            (length,) = cls._TITLE_LEN.unpack_from(buffer, start)
+            start += cls._TITLE_LEN.size
+            titles.append(bytes(view[start:start + length]).decode("utf-8"))
+            start += length
+        return cls(*arrays, titles, buffer=buffer)
+
+    def get_available_dates(self) -> List[date]:
+        return [date.fromordinal(ordinal) for ordinal in self._dates]
+
+    def _first_movie(self, index):
+        return self._movies[self._movie_ids[self._offsets[index]]]
+
+    def get_movie_for_date(self, query_date) -> Optional[Movie]:
+        """Same answer as MovieScheduler.get_movie_for_date."""
+        if not len(self._dates):
+            return None
+        query = query_date.toordinal()
+        index = bisect_left(self._dates, query)
+        if index < len(self._dates) and self._dates[index] == query:
+            return self._first_movie(index)
+        if index == 0:
+            return self._first_movie(0)
+        if index == len(self._dates):
+            return self._first_movie(index - 1)
+        if query - self._dates[index - 1] <= self._dates[index] - query:
+            return self._first_movie(index - 1)
+        return self._first_movie(index)
+